@@ -4,15 +4,22 @@ import os
 
 db = SQLAlchemy()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///user_data.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config or {})
     
     db.init_app(app)
     
     with app.app_context():
+        # Before create_all, so no pooled connection is opened without the SQL functions
+        from app.alerts import register_sqlite_functions
+        register_sqlite_functions(db.engine)
         db.create_all()
+        from app.database import upgrade_schema
+        with db.engine.begin() as connection:
+            upgrade_schema(connection)
     
     from app.routes import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
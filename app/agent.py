@@ -1,8 +1,8 @@
 import json
 import os
 from datetime import datetime
-from huggingface_hub import InferenceClient
 from app.finance_tools import FinanceAnalyzer
+from app.portfolio import allocation_for
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -10,6 +10,9 @@ logger = logging.getLogger(__name__)
 
 class FinancialAdvisor:
     def __init__(self):
+        # huggingface_hub is the slowest import in the app; only chat requests pay for it
+        from huggingface_hub import InferenceClient
+        
         self.hf_token = os.getenv('HUGGINGFACEHUB_API_TOKEN')
         self.client = InferenceClient(token=self.hf_token)
         self.model = "mistralai/Mistral-7B-Instruct-v0.3"
@@ -26,6 +29,7 @@ class FinancialAdvisor:
         )
         
         insights = analyzer.generate_insights()
+        projection = analyzer.project_sip_growth(risk_profile=user_data.get('risk_profile', 'Medium'))
         
         # Build context for AI
         context = f"""
@@ -35,6 +39,7 @@ class FinancialAdvisor:
         - Savings Rate: {analyzer.savings_rate:.1f}%
         - Risk Profile: {user_data.get('risk_profile', 'Medium')}
         - Goal: {user_data.get('financial_goal', 'General savings')} (₹{user_data.get('goal_amount', 0):,.0f} in {user_data.get('goal_months', 12)} months)
+        - Projected SIP value by then: ₹{projection['total']:,.0f} (equity ₹{projection['equity']:,.0f}, debt ₹{projection['debt']:,.0f}, gold ₹{projection['gold']:,.0f}; invested ₹{projection['invested']:,.0f}, {projection['progress']:.0f}% of goal)
         
         Current Insights:
         {json.dumps(insights, indent=2)}
@@ -69,10 +74,11 @@ class FinancialAdvisor:
             return {
                 'status': 'error',
                 'error': str(e),
-                'fallback_advice': self._get_fallback_advice(analyzer)
+                'fallback_advice': self._get_fallback_advice(analyzer, user_data.get('risk_profile', 'Medium'))
             }
     
-    def _get_fallback_advice(self, analyzer):
+    def _get_fallback_advice(self, analyzer, risk_profile='Medium'):
         """Provide fallback advice when AI service is unavailable"""
-        recommendations = analyzer.get_portfolio_rebalance_advice()
-        return f"Based on your financial profile, consider this allocation: 60% Equities (₹{recommendations['equity_sip']:,.0f}), 30% Debt (₹{recommendations['debt_sip']:,.0f}), 10% Gold (₹{recommendations['gold_sip']:,.0f})."
+        recommendations = analyzer.get_portfolio_rebalance_advice(risk_profile)
+        weights = allocation_for(risk_profile)
+        return f"Based on your financial profile, consider this allocation: {weights['equity']:.0%} Equities (₹{recommendations['equity_sip']:,.0f}), {weights['debt']:.0%} Debt (₹{recommendations['debt_sip']:,.0f}), {weights['gold']:.0%} Gold (₹{recommendations['gold_sip']:,.0f})."
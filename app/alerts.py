@@ -0,0 +1,106 @@
+from app import db
+from app.database import Alert, AlertArchive, dialect_insert
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, literal, or_, select
+import hashlib
+import math
+import sqlite3
+
+# Width of the value bucket per rule: an alert whose metric stays in the same
+# bucket is the same alert, only its last_seen moves.
+RULE_BUCKET_WIDTHS = {
+    'expense_range_critical': 5,
+    'expense_range_warning': 5,
+    'low_savings_rate': 5,
+    'high_expense_ratio': 5,
+    'emergency_fund_gap': 0.5,
+    'goal_off_track': 10,
+    'weekly_savings': 5000,
+    'expense_spike': 15,
+    'expense_anomaly': 25,
+}
+DEFAULT_BUCKET_WIDTH = 1
+UPSERT_BATCH_SIZE = 50000
+ALERT_TTL_DAYS = 30
+COMPACTION_BATCH_SIZE = 5000
+
+def value_bucket(rule, value):
+    """Coarse bucket of a rule's metric value"""
+    if value is None or not math.isfinite(value):
+        return str(value)
+    return math.floor(value / RULE_BUCKET_WIDTHS.get(rule, DEFAULT_BUCKET_WIDTH))
+
+def alert_fingerprint(user_id, rule, level, value):
+    """Stable identity of an alert: (user, rule, severity, value bucket)"""
+    key = f"{user_id}|{rule}|{level}|{value_bucket(rule, value)}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    # Lets set-based INSERT ... SELECT rules compute the same fingerprints in SQL
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('alert_fingerprint', 4, alert_fingerprint, deterministic=True)
+
+def register_sqlite_functions(engine):
+    """Make alert_fingerprint() available on every connection the engine opens"""
+    if not event.contains(engine, 'connect', _register_sqlite_functions):
+        event.listen(engine, 'connect', _register_sqlite_functions)
+
+def alert_row(user_id, rule, level, message, value, seen_at):
+    """Row dict for upsert_alerts"""
+    return {
+        'user_id': user_id,
+        'message': message,
+        'level': level,
+        'status': 'unread',
+        'rule': rule,
+        'fingerprint': alert_fingerprint(user_id, rule, level, value),
+        'created_at': seen_at,
+        'last_seen': seen_at
+    }
+
+def upsert_alerts(rows, batch_size=UPSERT_BATCH_SIZE):
+    """Insert new alerts and refresh last_seen/message on ones already raised.
+    
+    Returns the number of distinct alerts written.
+    """
+    rows = list({row['fingerprint']: row for row in rows}.values())
+    if not rows:
+        return 0
+    
+    stmt = dialect_insert()(Alert)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Alert.fingerprint],
+        set_={'last_seen': stmt.excluded.last_seen, 'message': stmt.excluded.message}
+    )
+    
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(stmt, rows[start:start + batch_size])
+        db.session.commit()
+    
+    return len(rows)
+
+def compact_alerts(ttl_days=ALERT_TTL_DAYS, batch_size=COMPACTION_BATCH_SIZE, now=None):
+    """Move read alerts and alerts not seen for ttl_days into alert_archive.
+    
+    Works in batches of batch_size rows, one short transaction each, so the
+    write lock is never held for long. Returns the number of rows archived.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=ttl_days)
+    # Alert.id becomes alert_id; archive rows get their own ids, since alert ids are reused once deleted
+    archive_columns = [c.name for c in Alert.__table__.columns if c.name != 'id']
+    stale = or_(Alert.status == 'read', func.coalesce(Alert.last_seen, Alert.created_at) < cutoff)
+    archived = 0
+    
+    while True:
+        ids = db.session.execute(select(Alert.id).where(stale).order_by(Alert.id).limit(batch_size)).scalars().all()
+        if not ids:
+            return archived
+        
+        db.session.execute(insert(AlertArchive).from_select(
+            ['alert_id'] + archive_columns + ['archived_at'],
+            select(Alert.id, *[Alert.__table__.c[name] for name in archive_columns], literal(now)).where(Alert.id.in_(ids))
+        ))
+        db.session.execute(delete(Alert).where(Alert.id.in_(ids)))
+        db.session.commit()
+        archived += len(ids)
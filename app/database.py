@@ -1,5 +1,8 @@
 from app import db
 from datetime import datetime
+from app.trends import TrendTracker
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,25 +14,55 @@ class User(db.Model):
     goal_amount = db.Column(db.Float, default=0)
     goal_months = db.Column(db.Integer, default=12)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
 class Finance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     income = db.Column(db.Float, default=0)
     expenses = db.Column(db.Float, default=0)
     savings = db.Column(db.Float, default=0)
     investments = db.Column(db.Float, default=0)
     emergency_fund = db.Column(db.Float, default=0)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class TrendState(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    count = db.Column(db.Integer, default=0)  # Finance rows folded in by app.trends.TrendTracker
+    last_value = db.Column(db.Float)
+    last_at = db.Column(db.DateTime)
+    previous_value = db.Column(db.Float)
+    previous_at = db.Column(db.DateTime)
+    ewma = db.Column(db.Float)
+    ewm_var = db.Column(db.Float, default=0)
+    mean = db.Column(db.Float, default=0)
+    m2 = db.Column(db.Float, default=0)  # sum of squared deviations from mean (Welford)
 
 class Alert(db.Model):
+    __table_args__ = (db.Index('ix_alert_user_created', 'user_id', 'created_at'),)
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
     level = db.Column(db.String(20), default='info')  # info, warning, critical
     status = db.Column(db.String(20), default='unread')  # unread, read
+    rule = db.Column(db.String(50))
+    fingerprint = db.Column(db.String(40), unique=True)  # hash of user, rule, level, value bucket
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AlertArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    alert_id = db.Column(db.Integer, index=True)  # id the row had in alert; SQLite can reuse it after deletes
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    message = db.Column(db.Text, nullable=False)
+    level = db.Column(db.String(20))
+    status = db.Column(db.String(20))
+    rule = db.Column(db.String(50))
+    fingerprint = db.Column(db.String(40))
+    created_at = db.Column(db.DateTime)
+    last_seen = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ChatHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -37,3 +70,113 @@ class ChatHistory(db.Model):
     role = db.Column(db.String(20), nullable=False)  # user, assistant
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class JobState(db.Model):
+    job_id = db.Column(db.String(50), primary_key=True)
+    high_water_mark = db.Column(db.DateTime)  # changes up to here have been processed
+    last_success = db.Column(db.DateTime)
+
+class SchedulerLease(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)  # host:pid of the process running the jobs
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class ReportIndex(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'month', name='uq_report_user_month'),
+        db.Index('ix_report_month_user', 'month', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    path = db.Column(db.String(255), nullable=False)  # NDJSON part holding the report line
+    offset = db.Column(db.Integer, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+
+class Task(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'shard', name='uq_task_run_shard'),
+        db.Index('ix_task_claim', 'job', 'status', 'next_run_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(50), nullable=False)
+    run_id = db.Column(db.String(100), nullable=False)  # one scheduled run of a job, e.g. daily_check:2025-01-31
+    shard = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON, default=dict)
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    holder = db.Column(db.String(100))
+    lease_until = db.Column(db.DateTime)
+    next_run_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)  # set exactly once, by the holder that finished the shard
+    error = db.Column(db.Text)
+
+class JobRun(db.Model):
+    __table_args__ = (db.Index('ix_job_run_job_started', 'job', 'started_at'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='running')  # running, success, failed
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    duration_seconds = db.Column(db.Float)
+    users_scanned = db.Column(db.Integer)
+    alerts_written = db.Column(db.Integer)
+    rows_processed = db.Column(db.Integer)  # the job's unit of work: users, alerts archived, reports...
+    rows_per_sec = db.Column(db.Float)
+    peak_rss_mb = db.Column(db.Float)  # peak RSS of the process so far
+    details = db.Column(db.JSON)
+    error = db.Column(db.Text)
+
+def upgrade_schema(connection):
+    """Add the columns and indexes newer models have to tables created by older versions.
+    
+    create_all() only creates missing tables, so a database such as the
+    shipped instance/user_data.db keeps its old alert, user and finance
+    tables. Safe to run on every start.
+    """
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            connection.exec_driver_sql(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} "
+                f"{column.type.compile(dialect=connection.dialect)}"
+            )
+            if column.unique:
+                # A UNIQUE column constraint cannot be added by ALTER TABLE; a unique index does the same job
+                connection.exec_driver_sql(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {preparer.quote(f'uq_{table.name}_{column.name}')} "
+                    f"ON {preparer.format_table(table)} ({preparer.format_column(column)})"
+                )
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def dialect_insert():
+    """INSERT construct with ON CONFLICT support for the configured database"""
+    return postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+
+def upsert_trend_states(connection, rows):
+    """Insert or overwrite TrendState rows (dicts from TrendTracker.as_row)"""
+    if not rows:
+        return
+    insert = (postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert)(TrendState)
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=[TrendState.user_id],
+        set_={column: insert.excluded[column] for column in rows[0] if column != 'user_id'}
+    ), rows)
+
+@event.listens_for(Finance, 'after_insert')
+def _track_expense_trend(mapper, connection, target):
+    # Runs inside the flush, so the trend commits or rolls back with the Finance row
+    state = connection.execute(select(TrendState.__table__).where(TrendState.user_id == target.user_id)).mappings().first()
+    tracker = TrendTracker.from_row(state) if state else TrendTracker()
+    upsert_trend_states(connection, [tracker.update(target.expenses, target.timestamp).as_row(target.user_id)])
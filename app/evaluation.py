@@ -0,0 +1,343 @@
+from app import db
+from app.database import User, Finance, Alert, JobState, TrendState, upsert_trend_states
+from app.finance_tools import BatchFinanceAnalyzer
+from app.trends import ANOMALY_WINDOW, TrendTracker, rolling_anomaly_scores
+from app.alerts import alert_row, upsert_alerts
+from app.rules import ALERT_RULES, RuleSet
+from app.sharding import DEFAULT_WORKERS, run_sharded
+from datetime import datetime
+from sqlalchemy import Integer, and_, case, cast, delete, func, literal, or_, select
+from sqlalchemy.dialects import sqlite
+import functools
+import itertools
+import numpy as np
+import string
+
+# Multiplicative hash (Knuth) spreading sequential user ids evenly over slots
+SLOT_HASH_MULTIPLIER = 2654435761
+TREND_REBUILD_BATCH_SIZE = 5000
+TREND_BACKFILL_JOB_ID = 'trend_state_backfill'  # JobState marker of a finished full rebuild
+ANOMALY_CHUNK_USERS = 5000
+
+def user_slot(user_id, slots):
+    """Time slot (0..slots-1) a user's daily check runs in"""
+    return (user_id * SLOT_HASH_MULTIPLIER) % 2**32 % slots
+
+def _user_slot_expr(slots):
+    # Same as user_slot, evaluated by the database
+    return (User.id * SLOT_HASH_MULTIPLIER) % 2**32 % slots
+
+def load_profile_columns(user_ids=None, changed_since=None, cohort=None, id_range=None):
+    """Load user ids, income, expenses, goal amount and goal months into NumPy arrays.
+    
+    Restricted to user_ids if given, to the users hashed into slot n of
+    `slots` for cohort=(n, slots), to lo <= id < hi for id_range=(lo, hi),
+    and with changed_since to users whose profile or finance rows changed
+    after that time.
+    """
+    query = select(
+        User.id,
+        func.coalesce(User.monthly_income, 0),
+        func.coalesce(User.monthly_expenses, 0),
+        func.coalesce(User.goal_amount, 0),
+        func.coalesce(User.goal_months, 12)
+    ).order_by(User.id)
+    
+    if user_ids is not None:
+        query = query.where(User.id.in_(user_ids))
+    if cohort is not None:
+        slot, slots = cohort
+        query = query.where(_user_slot_expr(slots) == slot)
+    if id_range is not None:
+        query = query.where(User.id >= id_range[0], User.id < id_range[1])
+    if changed_since is not None:
+        changed_finances = select(Finance.user_id).where(Finance.timestamp > changed_since)
+        query = query.where(or_(User.updated_at > changed_since, User.id.in_(changed_finances)))
+    
+    rows = db.session.execute(query).all()
+    
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+    
+    ids, income, expenses, goal_amount, goal_months = zip(*rows)
+    return (
+        np.fromiter(ids, dtype=np.int64, count=len(rows)),
+        np.fromiter(income, dtype=float, count=len(rows)),
+        np.fromiter(expenses, dtype=float, count=len(rows)),
+        np.fromiter(goal_amount, dtype=float, count=len(rows)),
+        np.fromiter(goal_months, dtype=float, count=len(rows))
+    )
+
+def profile_alert_rows(ids, income, expenses, goal_amount, goal_months, seen_at, rules=ALERT_RULES):
+    """Evaluate rules over whole columns and return alert rows.
+    
+    Profiles are analyzed with no emergency fund on record. Users without
+    a goal get no goal alerts.
+    """
+    analyzer = BatchFinanceAnalyzer(income, expenses, goal_amount=goal_amount, goal_months=goal_months, emergency_fund=0)
+    user_ids = ids.tolist()
+    has_goal = (goal_amount > 0).tolist()
+    return [alert_row(user_ids[i], rule.name, insight['type'], insight['message'], value, seen_at)
+            for i, rule, value, insight in rules.evaluate_vectorized(analyzer.metrics())
+            if rule.group != 'goal' or has_goal[i]]
+
+def evaluate_profiles(user_ids=None, changed_since=None, seen_at=None, cohort=None, id_range=None, rules=ALERT_RULES):
+    """Run an alert rule set (the full one by default) over the selected users and upsert the alerts.
+    
+    Shared by the daily check and the profile-change consumer so both raise
+    the same alerts with the same fingerprints. Returns (users, alerts).
+    """
+    seen_at = seen_at or datetime.utcnow()
+    columns = load_profile_columns(user_ids, changed_since, cohort, id_range)
+    return len(columns[0]), upsert_alerts(profile_alert_rows(*columns, seen_at, rules))
+
+def _sql_metrics():
+    # Metrics that are plain column arithmetic; rules over anything else use the NumPy path
+    income = func.coalesce(User.monthly_income, 0.0)
+    expenses = func.coalesce(User.monthly_expenses, 0.0)
+    return {
+        'monthly_income': income,
+        'monthly_expenses': expenses,
+        'monthly_savings': income - expenses,
+    }
+
+def _sql_amount(value):
+    """SQL rendering of value with Python's '{:,.0f}', ties to even included.
+    
+    value - CAST(value AS INTEGER) is exact for any double below 2**53, so
+    the comparisons below see the same ties Python's formatting does.
+    """
+    whole = cast(value, Integer)
+    fraction = value - whole
+    odd = whole % 2 != 0
+    rounded = whole + case(
+        (fraction > 0.5, 1),
+        (and_(fraction == 0.5, odd), 1),
+        (fraction < -0.5, -1),
+        (and_(fraction == -0.5, odd), -1),
+        else_=0
+    )
+    # Python keeps the sign of a negative value that rounds to zero
+    return case((and_(rounded == 0, value < 0), literal('-0')), else_=func.printf('%,d', rounded))
+
+def _sql_message(template, metrics):
+    """SQL expression rendering template, or None if a field can't be formatted in SQL"""
+    message = literal('')
+    for text, field, spec, conversion in string.Formatter().parse(template):
+        if text:
+            message = message + literal(text)
+        if field is None:
+            continue
+        if field not in metrics or conversion:
+            return None
+        if spec == ',.0f':
+            message = message + _sql_amount(metrics[field])
+        elif spec == '.1f':
+            message = message + func.printf('%.1f', metrics[field])
+        else:
+            return None
+    return message
+
+def _sql_rule_upsert(rule, seen_at):
+    """INSERT INTO alert SELECT ... FROM user WHERE <rule> ON CONFLICT upsert, or None"""
+    metrics = _sql_metrics()
+    referenced = {rule.metric} | {c.metric for c in rule.conditions} | {c.of for c in rule.conditions if c.of}
+    message = _sql_message(rule.template, metrics)
+    if message is None or not referenced <= metrics.keys():
+        return None
+    
+    seen = literal(seen_at, type_=db.DateTime)
+    rows = select(
+        User.id,
+        message,
+        literal(rule.level),
+        literal('unread'),
+        literal(rule.name),
+        func.alert_fingerprint(User.id, rule.name, rule.level, metrics[rule.metric]),
+        seen,
+        seen
+    ).where(and_(*[condition.evaluate(metrics) for condition in rule.conditions]))
+    
+    stmt = sqlite.insert(Alert).from_select(
+        ['user_id', 'message', 'level', 'status', 'rule', 'fingerprint', 'created_at', 'last_seen'], rows
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[Alert.fingerprint],
+        set_={'last_seen': stmt.excluded.last_seen, 'message': stmt.excluded.message}
+    )
+
+def evaluate_rules_set_based(rules, seen_at=None):
+    """Raise alerts for rules over the whole user table without loading users.
+    
+    On SQLite each rule whose conditions and message only use column
+    arithmetic runs as one INSERT ... SELECT; the remaining rules (or all of
+    them on other databases) fall back to the NumPy evaluator. Returns the
+    number of alert rows inserted or refreshed.
+    """
+    seen_at = seen_at or datetime.utcnow()
+    in_sql = db.engine.dialect.name == 'sqlite'
+    fallback = []
+    written = 0
+    
+    for rule in rules.rules:
+        stmt = _sql_rule_upsert(rule, seen_at) if in_sql else None
+        if stmt is None:
+            fallback.append(rule)
+        else:
+            written += db.session.execute(stmt).rowcount
+    db.session.commit()
+    
+    if fallback:
+        written += upsert_alerts(profile_alert_rows(*load_profile_columns(), seen_at, RuleSet(fallback)))
+    
+    return written
+
+def expense_spike_shard(connection, lo, hi, seen_at):
+    """Alert rows for expense spikes of users lo <= id < hi; runs in a shard worker.
+    
+    Reads one TrendState row per user instead of the Finance history.
+    """
+    states = connection.execute(
+        select(TrendState.__table__)
+        .where(TrendState.user_id >= lo, TrendState.user_id < hi, TrendState.previous_value.isnot(None))
+        .order_by(TrendState.user_id)
+    ).mappings()
+    
+    rows = []
+    for state in states:
+        trend = TrendTracker.from_row(state).spike()
+        if trend.get('spike_detected'):
+            rows.append(alert_row(state['user_id'], 'expense_spike', 'warning', trend['message'], trend['change_percent'], seen_at))
+    return rows
+
+def rebuild_trend_states(user_ids=None, batch_size=TREND_REBUILD_BATCH_SIZE):
+    """Recompute TrendState from the full Finance history; returns users rebuilt.
+    
+    For backfilling, and for rows written around the ORM (bulk Core inserts
+    skip the Finance after_insert hook). Works batch_size users at a time,
+    committing each batch like compact_alerts, so a long rebuild never
+    holds one huge transaction. A full rebuild records TREND_BACKFILL_JOB_ID
+    in JobState when it finishes.
+    """
+    if user_ids is None:
+        lo, hi = db.session.execute(select(func.min(Finance.user_id), func.max(Finance.user_id))).one()
+        # States of users left without any Finance rows
+        db.session.execute(delete(TrendState).where(
+            or_(TrendState.user_id < lo, TrendState.user_id > hi) if lo is not None else literal(True)
+        ))
+        chunks = [] if lo is None else [(start, start + batch_size) for start in range(lo, hi + 1, batch_size)]
+    else:
+        user_ids = sorted(user_ids)
+        chunks = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+    
+    rebuilt = 0
+    for chunk in chunks:
+        query = select(Finance.user_id, Finance.timestamp, Finance.expenses).order_by(Finance.user_id, Finance.timestamp, Finance.id)
+        if isinstance(chunk, tuple):
+            in_chunk = TrendState.user_id.between(chunk[0], chunk[1] - 1)
+            query = query.where(Finance.user_id >= chunk[0], Finance.user_id < chunk[1])
+        else:
+            in_chunk = TrendState.user_id.in_(chunk)
+            query = query.where(Finance.user_id.in_(chunk))
+        
+        rows = []
+        for user_id, history in itertools.groupby(db.session.execute(query).all(), key=lambda record: record.user_id):
+            tracker = TrendTracker()
+            for record in history:
+                tracker.update(record.expenses, record.timestamp)
+            rows.append(tracker.as_row(user_id))
+        db.session.execute(delete(TrendState).where(in_chunk))
+        upsert_trend_states(db.session.connection(), rows)
+        db.session.commit()
+        rebuilt += len(rows)
+    
+    if user_ids is None:
+        state = db.session.get(JobState, TREND_BACKFILL_JOB_ID) or JobState(job_id=TREND_BACKFILL_JOB_ID)
+        state.last_success = datetime.utcnow()
+        db.session.add(state)
+    db.session.commit()
+    return rebuilt
+
+def _anomaly_message(value, median):
+    if median > 0:
+        return f"Unusual spending: ₹{value:,.0f} is {(value - median) / median * 100:.0f}% above your recent median of ₹{median:,.0f}"
+    return f"Unusual spending: ₹{value:,.0f} against a recent median of ₹0"
+
+def expense_anomaly_shard(connection, lo, hi, seen_at, chunk_users=ANOMALY_CHUNK_USERS, window=ANOMALY_WINDOW):
+    """Alert rows for users lo <= id < hi whose latest expense is anomalous; runs in a shard worker.
+    
+    Loads only each user's latest window + 1 Finance rows, chunk_users
+    users at a time, so memory stays bounded however long the history is.
+    """
+    recent = select(
+        Finance.user_id,
+        Finance.expenses,
+        func.row_number().over(
+            partition_by=Finance.user_id,
+            order_by=(Finance.timestamp.desc(), Finance.id.desc())
+        ).label('age')
+    )
+    
+    rows = []
+    for start in range(lo, hi, chunk_users):
+        chunk = recent.where(Finance.user_id >= start, Finance.user_id < min(start + chunk_users, hi)).subquery()
+        records = connection.execute(
+            select(chunk.c.user_id, func.coalesce(chunk.c.expenses, 0))
+            .where(chunk.c.age <= window + 1)
+            .order_by(chunk.c.user_id, chunk.c.age.desc())
+        ).all()
+        if not records:
+            continue
+        
+        user_ids = np.fromiter((record[0] for record in records), dtype=np.int64, count=len(records))
+        expenses = np.fromiter((record[1] for record in records), dtype=float, count=len(records))
+        latest = np.r_[user_ids[1:] != user_ids[:-1], True].nonzero()[0]
+        scores = rolling_anomaly_scores(user_ids, expenses, rows=latest, window=window)
+        
+        flagged = scores['anomaly'] & (expenses[latest] > scores['median'])
+        for n in np.flatnonzero(flagged).tolist():
+            value, median = expenses[latest[n]].item(), scores['median'][n].item()
+            change = (value - median) / median * 100 if median > 0 else value
+            rows.append(alert_row(user_ids[latest[n]].item(), 'expense_anomaly', 'warning',
+                                  _anomaly_message(value, median), change, seen_at))
+    return rows
+
+def run_expense_anomaly_check(workers=DEFAULT_WORKERS, shards=None):
+    """Score every user's latest expense against their recent history, sharded like run_expense_trend_check.
+    
+    Returns (shards, alerts).
+    """
+    seen_at = datetime.utcnow()
+    id_range = db.session.execute(select(func.min(Finance.user_id), func.max(Finance.user_id))).one()
+    database_uri = db.engine.url.render_as_string(hide_password=False)
+    
+    rows = []
+    shard_count = 0
+    for shard_rows in run_sharded(functools.partial(expense_anomaly_shard, seen_at=seen_at),
+                                  database_uri, tuple(id_range), workers, shards):
+        rows.extend(shard_rows)
+        shard_count += 1
+    
+    return shard_count, upsert_alerts(rows)
+
+def run_expense_trend_check(workers=DEFAULT_WORKERS, shards=None):
+    """Expense spike detection over per-user trend state, sharded by user id across processes.
+    
+    Shard results are merged here and written with one bulk upsert.
+    Returns (shards, alerts).
+    """
+    seen_at = datetime.utcnow()
+    if db.session.get(JobState, TREND_BACKFILL_JOB_ID) is None:
+        # First run against history written before trends were tracked
+        rebuild_trend_states()
+    id_range = db.session.execute(select(func.min(TrendState.user_id), func.max(TrendState.user_id))).one()
+    database_uri = db.engine.url.render_as_string(hide_password=False)
+    
+    rows = []
+    shard_count = 0
+    for shard_rows in run_sharded(functools.partial(expense_spike_shard, seen_at=seen_at),
+                                  database_uri, tuple(id_range), workers, shards):
+        rows.extend(shard_rows)
+        shard_count += 1
+    
+    return shard_count, upsert_alerts(rows)
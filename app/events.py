@@ -0,0 +1,51 @@
+from app.evaluation import evaluate_profiles
+from app.rules import PROFILE_EVENT_RULES
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on users evaluated together when many profile writes queue up
+MAX_EVENT_BATCH = 500
+
+_profile_changes = queue.Queue()
+_consumer_lock = threading.Lock()
+_consumer_thread = None
+
+def publish_profile_change(user_id):
+    """Queue a user for alert evaluation; returns immediately"""
+    _profile_changes.put(user_id)
+
+def _drain(first, limit=MAX_EVENT_BATCH):
+    # Coalesce a burst of writes (and repeated writes for one user) into one batch
+    user_ids = {first}
+    while len(user_ids) < limit:
+        try:
+            user_ids.add(_profile_changes.get_nowait())
+        except queue.Empty:
+            break
+    return user_ids
+
+def _consume(app):
+    while True:
+        user_ids = _drain(_profile_changes.get())
+        try:
+            with app.app_context():
+                users, alerts = evaluate_profiles(user_ids=sorted(user_ids), rules=PROFILE_EVENT_RULES)
+            logger.debug(f"Evaluated {users} changed profiles ({alerts} alerts)")
+        except Exception:
+            logger.exception(f"Alert evaluation failed for users {sorted(user_ids)}")
+
+def start_event_consumer(app):
+    """Start the background thread that evaluates alerts for changed profiles.
+    
+    Events live only in this process; anything lost in a crash is picked up
+    by the daily check's change scan.
+    """
+    global _consumer_thread
+    with _consumer_lock:
+        if _consumer_thread is None:
+            _consumer_thread = threading.Thread(target=_consume, args=(app,), daemon=True, name='profile-events')
+            _consumer_thread.start()
+    return _consumer_thread
@@ -1,114 +1,219 @@
-import pandas as pd
 import numpy as np
+import os
 from datetime import datetime, timedelta
+from app.cache import LRUCache
+from app.rules import INSIGHT_RULES
+from app.trends import TrendTracker
+from app.forecasting import DEFAULT_PATHS, DEFAULT_RISK_PROFILE, forecast_goal, forecast_goals
+from app.portfolio import ALLOCATION_ENGINE
+from app.projections import project_portfolio
 
-class FinanceAnalyzer:
+INSIGHT_CACHE_SIZE = int(os.getenv('INSIGHT_CACHE_SIZE', 10000))
+INSIGHT_CACHE_TTL = float(os.getenv('INSIGHT_CACHE_TTL', 0)) or None  # seconds; unset means entries never expire
+
+# Shared by every FinanceAnalyzer. Keys include the rule version, so changed rules never serve stale insights.
+INSIGHT_CACHE = LRUCache(INSIGHT_CACHE_SIZE, INSIGHT_CACHE_TTL)
+
+def _as_column(values, size=None):
+    column = np.asarray(values, dtype=float)
+    if column.ndim == 0 and size is not None:
+        column = np.full(size, float(column))
+    return column
+
+class BatchFinanceAnalyzer:
+    """Columnar FinanceAnalyzer: every method works on whole arrays of profiles at once"""
+    
     def __init__(self, monthly_income, monthly_expenses, goal_amount, goal_months, emergency_fund):
-        self.monthly_income = monthly_income
-        self.monthly_expenses = monthly_expenses
-        self.monthly_savings = monthly_income - monthly_expenses
-        self.savings_rate = (self.monthly_savings / monthly_income * 100) if monthly_income > 0 else 0
-        self.goal_amount = goal_amount
-        self.goal_months = goal_months
-        self.emergency_fund = emergency_fund
+        self.monthly_income = _as_column(monthly_income)
+        size = self.monthly_income.size
+        self.monthly_expenses = _as_column(monthly_expenses, size)
+        self.goal_amount = _as_column(goal_amount, size)
+        self.goal_months = _as_column(goal_months, size)
+        self.emergency_fund = _as_column(emergency_fund, size)
+        
+        self.monthly_savings = self.monthly_income - self.monthly_expenses
+        has_income = self.monthly_income > 0
+        self.savings_rate = np.where(has_income, self.monthly_savings / np.where(has_income, self.monthly_income, 1.0) * 100, 0.0)
+    
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build from a DataFrame with one column per constructor argument"""
+        return cls(
+            monthly_income=df['monthly_income'].to_numpy(dtype=float),
+            monthly_expenses=df['monthly_expenses'].to_numpy(dtype=float),
+            goal_amount=df['goal_amount'].to_numpy(dtype=float) if 'goal_amount' in df else 0,
+            goal_months=df['goal_months'].to_numpy(dtype=float) if 'goal_months' in df else 12,
+            emergency_fund=df['emergency_fund'].to_numpy(dtype=float) if 'emergency_fund' in df else 0
+        )
+    
+    def __len__(self):
+        return self.monthly_income.size
     
     def analyze_expenses(self):
-        """Analyze spending patterns and identify concerns"""
-        insights = []
-        
-        if self.savings_rate < 20:
-            insights.append({
-                'type': 'warning',
-                'message': f'Low savings rate ({self.savings_rate:.1f}%). Consider increasing SIP or cutting expenses.'
-            })
+        """Spending ratios plus masks for the low-savings and high-expense rules"""
+        nonzero_income = self.monthly_income != 0
+        expense_ratio = self.monthly_expenses / np.where(nonzero_income, self.monthly_income, 1.0) * 100
         
-        if self.monthly_expenses > self.monthly_income * 0.8:
-            insights.append({
-                'type': 'critical',
-                'message': f'Expenses are {(self.monthly_expenses/self.monthly_income*100):.1f}% of income. Budget tightening recommended.'
-            })
-        
-        return insights
+        return {
+            'savings_rate': self.savings_rate,
+            'expense_ratio': expense_ratio,
+            'low_savings': self.savings_rate < 20,
+            'high_expenses': nonzero_income & (self.monthly_expenses > self.monthly_income * 0.8)
+        }
     
     def analyze_emergency_fund(self):
-        """Check emergency fund adequacy"""
-        months_covered = self.emergency_fund / self.monthly_expenses if self.monthly_expenses > 0 else 0
-        insights = []
+        """Months of expenses covered and the gap to a 3 month buffer"""
+        has_expenses = self.monthly_expenses > 0
+        months_covered = np.where(has_expenses, self.emergency_fund / np.where(has_expenses, self.monthly_expenses, 1.0), 0.0)
         
-        if months_covered < 3:
-            required = self.monthly_expenses * 3
-            gap = required - self.emergency_fund
-            insights.append({
-                'type': 'warning',
-                'message': f'Emergency fund covers only {months_covered:.1f} months. Target: 3-6 months. Shortfall: ₹{gap:,.0f}'
-            })
-        
-        return insights
+        return {
+            'months_covered': months_covered,
+            'shortfall': self.monthly_expenses * 3 - self.emergency_fund,
+            'insufficient': months_covered < 3
+        }
     
     def forecast_goal_achievement(self):
-        """Predict if goal will be achieved"""
-        monthly_contribution = self.monthly_savings
-        projected_savings = monthly_contribution * self.goal_months
-        achievement_rate = (projected_savings / self.goal_amount * 100) if self.goal_amount > 0 else 0
+        """Projected savings over goal_months versus goal_amount"""
+        projected_savings = self.monthly_savings * self.goal_months
+        has_goal = self.goal_amount > 0
+        achievement_rate = np.where(has_goal, projected_savings / np.where(has_goal, self.goal_amount, 1.0) * 100, 0.0)
         
         return {
             'projected_savings': projected_savings,
             'goal_amount': self.goal_amount,
             'achievement_rate': achievement_rate,
-            'shortfall': max(0, self.goal_amount - projected_savings),
+            'shortfall': np.maximum(0, self.goal_amount - projected_savings),
             'on_track': achievement_rate >= 100
         }
     
-    def get_portfolio_rebalance_advice(self):
-        """Generate portfolio rebalancing suggestions"""
+    def forecast_goal_probability(self, risk_profile=DEFAULT_RISK_PROFILE, paths=DEFAULT_PATHS, seed=None):
+        """Monte Carlo probability of reaching each goal, with percentile bands of the final balance"""
+        return forecast_goals(self.monthly_income, self.monthly_expenses, self.goal_amount, self.goal_months,
+                              risk_profile, paths=paths, seed=seed)
+    
+    def get_portfolio_rebalance_advice(self, risk_profile=DEFAULT_RISK_PROFILE):
+        """Savings plus emergency fund split per the risk profile's allocation (one profile or one per row)"""
         total_investable = self.monthly_savings + self.emergency_fund
+        weights = ALLOCATION_ENGINE.weight_columns(risk_profile, len(self))
+        
+        advice = {'emergency_fund': self.emergency_fund}
+        for asset, weight in weights.items():
+            advice[f'{asset}_sip'] = total_investable * weight
+        return advice
+    
+    def project_sip_growth(self, months=None, annual_step_up=0.0, risk_profile=DEFAULT_RISK_PROFILE):
+        """Future value of investing monthly savings as SIPs per the risk profile's allocation, over goal_months by default"""
+        return project_portfolio(self.monthly_savings, self.goal_months if months is None else months,
+                                 allocation=ALLOCATION_ENGINE.weight_columns(risk_profile, len(self)),
+                                 returns=ALLOCATION_ENGINE.expected_returns, annual_step_up=annual_step_up)
+    
+    def metrics(self):
+        """Every named metric the alert rules can refer to, as arrays"""
+        expenses = self.analyze_expenses()
+        emergency = self.analyze_emergency_fund()
+        goal = self.forecast_goal_achievement()
         
-        recommendations = {
-            'emergency_fund': self.emergency_fund,
-            'equity_sip': total_investable * 0.6,
-            'debt_sip': total_investable * 0.3,
-            'gold_sip': total_investable * 0.1
+        return {
+            'monthly_income': self.monthly_income,
+            'monthly_expenses': self.monthly_expenses,
+            'monthly_savings': self.monthly_savings,
+            'savings_rate': expenses['savings_rate'],
+            'expense_ratio': expenses['expense_ratio'],
+            'months_covered': emergency['months_covered'],
+            'emergency_shortfall': emergency['shortfall'],
+            'achievement_rate': goal['achievement_rate'],
+            'goal_gap': 100 - goal['achievement_rate'],
+            'goal_shortfall': goal['shortfall'],
         }
+    
+    def insight_rows(self, rules=INSIGHT_RULES):
+        """All (index, rule, value, insight) rows, in rule order for each profile.
         
-        return recommendations
+        Rules are evaluated as NumPy masks; only the flagged rows are formatted.
+        """
+        rows = rules.evaluate_vectorized(self.metrics())
+        # Stable sort keeps each row's insights in rule order
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+class FinanceAnalyzer:
+    """Single-profile view over BatchFinanceAnalyzer, evaluating rules with scalar comparisons"""
+    
+    def __init__(self, monthly_income, monthly_expenses, goal_amount, goal_months, emergency_fund):
+        self.monthly_income = monthly_income
+        self.monthly_expenses = monthly_expenses
+        self.monthly_savings = monthly_income - monthly_expenses
+        self.savings_rate = (self.monthly_savings / monthly_income * 100) if monthly_income > 0 else 0
+        self.goal_amount = goal_amount
+        self.goal_months = goal_months
+        self.emergency_fund = emergency_fund
+        self._batch_analyzer = None
+        self._metrics = None
+    
+    @property
+    def _batch(self):
+        # Built on first use, so cached insights never touch NumPy
+        if self._batch_analyzer is None:
+            self._batch_analyzer = BatchFinanceAnalyzer([self.monthly_income], self.monthly_expenses, self.goal_amount,
+                                                        self.goal_months, self.emergency_fund)
+        return self._batch_analyzer
+    
+    def profile_key(self):
+        """Everything generate_insights depends on, including the rule version"""
+        return (self.monthly_income, self.monthly_expenses, self.goal_amount, self.goal_months, self.emergency_fund,
+                INSIGHT_RULES.version)
+    
+    def metrics(self):
+        if self._metrics is None:
+            self._metrics = {name: value[0].item() for name, value in self._batch.metrics().items()}
+        return self._metrics
+    
+    def _insights(self, *groups):
+        return [insight for _, insight in INSIGHT_RULES.select(groups).evaluate_scalar(self.metrics())]
+    
+    def analyze_expenses(self):
+        """Analyze spending patterns and identify concerns"""
+        return self._insights('expenses')
+    
+    def analyze_emergency_fund(self):
+        """Check emergency fund adequacy"""
+        return self._insights('emergency_fund')
+    
+    def forecast_goal_achievement(self):
+        """Predict if goal will be achieved"""
+        forecast = self._batch.forecast_goal_achievement()
+        return {key: value[0].item() for key, value in forecast.items()}
+    
+    def forecast_goal_probability(self, risk_profile=DEFAULT_RISK_PROFILE, paths=DEFAULT_PATHS, seed=None):
+        """Simulate savings paths to estimate the chance of reaching the goal"""
+        return forecast_goal(self.monthly_income, self.monthly_expenses, self.goal_amount, self.goal_months,
+                             risk_profile, paths=paths, seed=seed)
+    
+    def get_portfolio_rebalance_advice(self, risk_profile=DEFAULT_RISK_PROFILE):
+        """Generate portfolio rebalancing suggestions"""
+        advice = self._batch.get_portfolio_rebalance_advice(risk_profile)
+        return {key: value[0].item() for key, value in advice.items()}
+    
+    def project_sip_growth(self, months=None, annual_step_up=0.0, risk_profile=DEFAULT_RISK_PROFILE):
+        """Project SIP growth per asset class and against the goal"""
+        projection = {key: value[0].item() for key, value in self._batch.project_sip_growth(months, annual_step_up, risk_profile).items()}
+        projection['progress'] = projection['total'] / self.goal_amount * 100 if self.goal_amount > 0 else 0
+        return projection
     
     def generate_insights(self):
         """Generate comprehensive financial insights with INR formatting"""
-        all_insights = []
-        
-        all_insights.extend(self.analyze_expenses())
-        all_insights.extend(self.analyze_emergency_fund())
-        
-        goal_forecast = self.forecast_goal_achievement()
-        if not goal_forecast['on_track']:
-            shortfall = goal_forecast['shortfall']
-            all_insights.append({
-                'type': 'warning',
-                'message': f"Goal off track by {100 - goal_forecast['achievement_rate']:.1f}%. Need to save ₹{shortfall:,.0f} more."
-            })
-        
-        return all_insights
+        insights = INSIGHT_CACHE.get_or_compute(
+            self.profile_key(), lambda: tuple(self._insights('expenses', 'emergency_fund', 'goal'))
+        )
+        # Copies, so a caller editing its insights cannot change the cached ones
+        return [dict(insight) for insight in insights]
 
 def calculate_monthly_trends(finance_records):
     """Calculate month-over-month trends"""
     if not finance_records or len(finance_records) < 2:
         return {}
     
-    df = pd.DataFrame([{
-        'timestamp': r.timestamp,
-        'expenses': r.expenses
-    } for r in finance_records])
-    
-    if len(df) >= 2:
-        latest_expense = df.iloc[-1]['expenses']
-        prev_expense = df.iloc[-2]['expenses']
-        change = ((latest_expense - prev_expense) / prev_expense * 100) if prev_expense > 0 else 0
-        
-        if abs(change) > 15:
-            return {
-                'spike_detected': True,
-                'change_percent': change,
-                'message': f"Expense spike detected: {change:+.1f}% (₹{latest_expense:,.0f})"
-            }
-    
-    return {'spike_detected': False}
+    tracker = TrendTracker()
+    for record in finance_records:
+        tracker.update(record.expenses, record.timestamp)
+    return tracker.spike()
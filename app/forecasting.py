@@ -0,0 +1,154 @@
+"""Monte Carlo goal forecasting.
+
+Each simulated path saves income - expenses every month, with random
+income shocks and expense noise, and compounds the balance at a monthly
+return drawn for the user's risk profile. Paths are simulated together as
+NumPy arrays; the only Python loop is over months.
+"""
+import numpy as np
+
+# Annual expected return and volatility per risk profile
+RETURN_ASSUMPTIONS = {
+    'Low': (0.06, 0.04),
+    'Medium': (0.09, 0.10),
+    'High': (0.12, 0.18),
+}
+DEFAULT_RISK_PROFILE = 'Medium'
+
+INCOME_SHOCK_PROBABILITY = 0.01  # chance per month of an income shock
+INCOME_SHOCK_SEVERITY = 0.5  # share of that month's income lost
+EXPENSE_VOLATILITY = 0.10  # monthly expense noise, as a share of expenses
+
+DEFAULT_PATHS = 10000
+PERCENTILES = (5, 25, 50, 75, 95)
+MAX_BATCH_CELLS = 4000000  # users x paths simulated at once in forecast_goals
+
+def return_assumptions(risk_profile):
+    """(annual return, annual volatility) for a risk profile, case-insensitive"""
+    key = str(risk_profile or DEFAULT_RISK_PROFILE).capitalize()
+    return RETURN_ASSUMPTIONS.get(key, RETURN_ASSUMPTIONS[DEFAULT_RISK_PROFILE])
+
+def _monthly_log_returns(annual_return, annual_volatility):
+    # Lognormal monthly growth whose mean compounds to annual_return
+    sigma = annual_volatility / np.sqrt(12)
+    mu = np.log1p(annual_return) / 12 - sigma ** 2 / 2
+    return mu, sigma
+
+def make_rng(seed=None):
+    """Generator for the simulations; SFC64 draws normals faster than the default PCG64"""
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.Generator(np.random.SFC64(seed))
+
+def simulate_balances(monthly_income, monthly_expenses, months, annual_return, annual_volatility,
+                      starting_balance=0.0, paths=DEFAULT_PATHS, rng=None):
+    """Balance of every path at each user's horizon, shape (users, paths).
+    
+    All arguments except paths and rng are per-user arrays (or scalars).
+    Savings are added at the end of each month, after that month's return.
+    Paths are simulated in float32, which halves the cost of the random draws.
+    """
+    rng = make_rng(rng)
+    income = np.atleast_1d(np.asarray(monthly_income, dtype=np.float32))
+    users = income.size
+    expenses = np.broadcast_to(np.asarray(monthly_expenses, dtype=np.float32), (users,))
+    months = np.broadcast_to(np.asarray(months, dtype=int), (users,))
+    mu, sigma = _monthly_log_returns(
+        np.broadcast_to(np.asarray(annual_return, dtype=float), (users,)),
+        np.broadcast_to(np.asarray(annual_volatility, dtype=float), (users,))
+    )
+    mu, sigma = mu.astype(np.float32)[:, None], sigma.astype(np.float32)[:, None]
+    savings = (income - expenses)[:, None]
+    # Uniform expense noise with EXPENSE_VOLATILITY standard deviation; uniforms are ~4x cheaper than normals
+    noise_width = (expenses * np.float32(2 * EXPENSE_VOLATILITY * np.sqrt(3)))[:, None]
+    shock_loss = income * np.float32(INCOME_SHOCK_SEVERITY)
+    
+    balance = np.empty((users, paths), dtype=np.float32)
+    balance[:] = np.broadcast_to(np.asarray(starting_balance, dtype=np.float32), (users,))[:, None]
+    at_horizon = balance.astype(float)
+    growth = np.empty((users, paths), dtype=np.float32)
+    noise = np.empty((users, paths), dtype=np.float32)
+    for month in range(1, int(months.max(initial=0)) + 1):
+        rng.standard_normal(dtype=np.float32, out=growth)
+        growth *= sigma
+        growth += mu
+        np.exp(growth, out=growth)
+        balance *= growth
+        
+        rng.random(dtype=np.float32, out=noise)
+        noise -= np.float32(0.5)
+        noise *= noise_width
+        balance -= noise
+        balance += savings
+        
+        # Shocks are rare, so draw how many there are and then where they land
+        shocks = rng.binomial(users * paths, INCOME_SHOCK_PROBABILITY)
+        if shocks:
+            cells = rng.integers(0, users * paths, shocks)
+            np.subtract.at(balance.reshape(-1), cells, shock_loss[cells // paths])
+        
+        done = months == month
+        if done.any():
+            at_horizon[done] = balance[done]
+    return at_horizon
+
+def _summarize(balances, goal_amount):
+    goal = np.asarray(goal_amount, dtype=float).reshape(-1, 1)
+    bands = np.percentile(balances, PERCENTILES, axis=1)
+    return {
+        'probability': (balances >= goal).mean(axis=1),
+        'expected_balance': balances.mean(axis=1),
+        'percentiles': {p: band for p, band in zip(PERCENTILES, bands)},
+    }
+
+def forecast_goal(monthly_income, monthly_expenses, goal_amount, goal_months, risk_profile=DEFAULT_RISK_PROFILE,
+                  starting_balance=0.0, paths=DEFAULT_PATHS, seed=None):
+    """Probability of reaching goal_amount within goal_months, with percentile bands of the final balance"""
+    annual_return, annual_volatility = return_assumptions(risk_profile)
+    balances = simulate_balances(monthly_income, monthly_expenses, goal_months, annual_return, annual_volatility,
+                                 starting_balance, paths, seed)
+    summary = _summarize(balances, goal_amount)
+    return {
+        'probability': summary['probability'][0].item(),
+        'expected_balance': summary['expected_balance'][0].item(),
+        'percentiles': {p: band[0].item() for p, band in summary['percentiles'].items()},
+        'goal_amount': goal_amount,
+        'goal_months': goal_months,
+        'risk_profile': risk_profile,
+        'paths': paths,
+    }
+
+def forecast_goals(monthly_income, monthly_expenses, goal_amount, goal_months, risk_profile,
+                   starting_balance=0.0, paths=DEFAULT_PATHS, seed=None):
+    """forecast_goal for many users at once; every value in the result is a per-user array.
+    
+    Users are simulated in chunks of at most MAX_BATCH_CELLS path cells.
+    One seed makes the whole batch reproducible.
+    """
+    income = np.atleast_1d(np.asarray(monthly_income, dtype=float))
+    users = income.size
+    expenses = np.broadcast_to(np.asarray(monthly_expenses, dtype=float), (users,))
+    goal_amount = np.broadcast_to(np.asarray(goal_amount, dtype=float), (users,))
+    goal_months = np.broadcast_to(np.asarray(goal_months, dtype=int), (users,))
+    starting_balance = np.broadcast_to(np.asarray(starting_balance, dtype=float), (users,))
+    profiles = np.broadcast_to(np.asarray(risk_profile, dtype=object), (users,))
+    assumptions = np.array([return_assumptions(profile) for profile in profiles], dtype=float).reshape(users, 2)
+    
+    rng = make_rng(seed)
+    chunk = max(1, MAX_BATCH_CELLS // paths)
+    parts = []
+    for lo in range(0, users, chunk):
+        hi = min(lo + chunk, users)
+        balances = simulate_balances(income[lo:hi], expenses[lo:hi], goal_months[lo:hi],
+                                     assumptions[lo:hi, 0], assumptions[lo:hi, 1],
+                                     starting_balance[lo:hi], paths, rng)
+        parts.append(_summarize(balances, goal_amount[lo:hi]))
+    
+    if not parts:
+        return {'probability': np.empty(0), 'expected_balance': np.empty(0),
+                'percentiles': {p: np.empty(0) for p in PERCENTILES}}
+    return {
+        'probability': np.concatenate([part['probability'] for part in parts]),
+        'expected_balance': np.concatenate([part['expected_balance'] for part in parts]),
+        'percentiles': {p: np.concatenate([part['percentiles'][p] for part in parts]) for p in PERCENTILES},
+    }
@@ -0,0 +1,52 @@
+from app import db
+from app.database import SchedulerLease
+from datetime import datetime, timedelta
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+import os
+import socket
+
+SCHEDULER_LEASE = 'scheduler'
+LEASE_TTL_SECONDS = 60
+LEASE_RENEW_SECONDS = 20
+
+def lease_holder_id():
+    """Identity of this process in the lease table"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def try_acquire_lease(name, holder, ttl_seconds=LEASE_TTL_SECONDS):
+    """Take or renew the named lease; True if holder owns it afterwards.
+    
+    A lease can only be taken over once its current holder stopped renewing
+    it for ttl_seconds, so at most one process holds it at a time.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    
+    result = db.session.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name)
+        .where(or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now))
+        .values(holder=holder, expires_at=expires_at)
+    )
+    if result.rowcount:
+        db.session.commit()
+        return True
+    
+    if db.session.get(SchedulerLease, name) is not None:
+        db.session.rollback()
+        return False
+    
+    try:
+        db.session.add(SchedulerLease(name=name, holder=holder, expires_at=expires_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # Another process created the lease first
+        db.session.rollback()
+        return False
+
+def release_lease(name, holder):
+    """Give the lease up early so another process can take over immediately"""
+    db.session.execute(delete(SchedulerLease).where(SchedulerLease.name == name, SchedulerLease.holder == holder))
+    db.session.commit()
@@ -0,0 +1,66 @@
+from app import db
+from app.database import JobRun
+from datetime import datetime
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where getrusage is unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class JobMetrics:
+    """Counters a job fills in while it runs; see track_job"""
+    
+    def __init__(self):
+        self.users_scanned = None
+        self.alerts_written = None
+        self.rows_processed = None
+        self.details = None
+
+@contextlib.contextmanager
+def track_job(job):
+    """Record one run of job in job_run with its duration, counters and throughput.
+    
+    Needs an app context. rows_processed defaults to users_scanned; a
+    failing job is recorded as failed and the exception re-raised.
+    """
+    run = JobRun(job=job, status='running', started_at=datetime.utcnow())
+    db.session.add(run)
+    db.session.commit()
+    run_id = run.id
+    
+    metrics = JobMetrics()
+    start = time.perf_counter()
+    status, error = 'success', None
+    try:
+        yield metrics
+    except Exception as e:
+        status, error = 'failed', repr(e)
+        raise
+    finally:
+        db.session.rollback()
+        duration = time.perf_counter() - start
+        rows = metrics.rows_processed if metrics.rows_processed is not None else metrics.users_scanned
+        
+        run = db.session.get(JobRun, run_id)
+        run.status = status
+        run.error = error
+        run.finished_at = datetime.utcnow()
+        run.duration_seconds = duration
+        run.users_scanned = metrics.users_scanned
+        run.alerts_written = metrics.alerts_written
+        run.rows_processed = rows
+        run.rows_per_sec = rows / duration if rows is not None and duration > 0 else None
+        run.peak_rss_mb = peak_rss_mb()
+        run.details = metrics.details
+        db.session.commit()
@@ -0,0 +1,70 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """One step of a Pipeline: func(inputs) -> result, run once every stage in `after` is done.
+    
+    inputs maps each dependency's name to its result, so intermediate data
+    is handed over in memory instead of being re-queried.
+    """
+    
+    def __init__(self, name, func, after=()):
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+
+class Pipeline:
+    """Runs a DAG of stages, independent stages in parallel threads"""
+    
+    def __init__(self, name, stages, context=None):
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        # Entered around every stage, e.g. app.app_context for DB access
+        self.context = context or contextlib.nullcontext
+        
+        for stage in stages:
+            missing = set(stage.after) - self.stages.keys()
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages {sorted(missing)}")
+    
+    def _run_stage(self, stage, inputs):
+        start = time.perf_counter()
+        with self.context():
+            result = stage.func(inputs)
+        return result, time.perf_counter() - start
+    
+    def run(self, max_workers=4):
+        """Run every stage; returns ({stage: result}, {stage: seconds})"""
+        results = {}
+        timings = {}
+        pending = dict(self.stages)
+        running = {}
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.name) as pool:
+            while pending or running:
+                for stage in [s for s in pending.values() if all(dep in results for dep in s.after)]:
+                    del pending[stage.name]
+                    inputs = {dep: results[dep] for dep in stage.after}
+                    running[pool.submit(self._run_stage, stage, inputs)] = stage
+                
+                if not running:
+                    raise ValueError(f"Pipeline {self.name} has a dependency cycle among {sorted(pending)}")
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        results[stage.name], timings[stage.name] = future.result()
+                    except Exception:
+                        logger.exception(f"Pipeline {self.name}: stage {stage.name} failed")
+                        # Nothing downstream can run; let in-flight stages finish and stop
+                        pending.clear()
+                        wait(running)
+                        raise
+                    logger.info(f"   {self.name}.{stage.name} finished in {timings[stage.name]:.2f}s")
+        
+        return results, timings
@@ -0,0 +1,155 @@
+"""Risk-profile-aware asset allocation.
+
+An AllocationEngine turns market assumptions (expected returns and a
+covariance matrix) into one allocation per risk profile: risk parity for
+Low, long-only mean-variance with a profile-specific risk aversion for
+Medium and High. Solutions are cached per set of assumptions, so advice
+for a user is a dictionary lookup plus a scale; they are only re-solved
+when the assumptions or return history actually change.
+"""
+import hashlib
+import numpy as np
+import threading
+from app.projections import ASSET_RETURNS
+
+# Annual volatility per asset class and pairwise correlations (same order as ASSET_RETURNS)
+ASSET_VOLATILITY = {'equity': 0.18, 'debt': 0.04, 'gold': 0.15}
+ASSET_CORRELATION = [
+    [1.0, 0.1, -0.1],
+    [0.1, 1.0, 0.2],
+    [-0.1, 0.2, 1.0],
+]
+
+# Objective per risk profile: ('risk_parity', None) or ('mean_variance', risk aversion)
+PROFILE_OBJECTIVES = {
+    'Low': ('risk_parity', None),
+    'Medium': ('mean_variance', 3.0),
+    'High': ('mean_variance', 1.75),
+}
+DEFAULT_PROFILE = 'Medium'
+
+SOLVER_ITERATIONS = 2000
+SOLVER_TOLERANCE = 1e-10
+
+def _project_to_simplex(v):
+    # Euclidean projection onto {w >= 0, sum(w) = 1} (Duchi et al. 2008)
+    u = np.sort(v)[::-1]
+    cumulative = np.cumsum(u) - 1
+    rho = np.flatnonzero(u - cumulative / np.arange(1, v.size + 1) > 0)[-1]
+    return np.maximum(v - cumulative[rho] / (rho + 1), 0)
+
+def mean_variance_weights(expected_returns, covariance, risk_aversion):
+    """Long-only, fully invested weights maximizing mu'w - risk_aversion/2 * w'Cw (projected gradient)"""
+    mu = np.asarray(expected_returns, dtype=float)
+    covariance = np.asarray(covariance, dtype=float)
+    step = 1 / (risk_aversion * np.linalg.eigvalsh(covariance)[-1])
+    weights = np.full(mu.size, 1 / mu.size)
+    for _ in range(SOLVER_ITERATIONS):
+        updated = _project_to_simplex(weights + step * (mu - risk_aversion * covariance @ weights))
+        if np.abs(updated - weights).max() < SOLVER_TOLERANCE:
+            return updated
+        weights = updated
+    return weights
+
+def risk_parity_weights(covariance):
+    """Weights where every asset contributes equally to portfolio variance (cyclical coordinate descent)"""
+    covariance = np.asarray(covariance, dtype=float)
+    n = covariance.shape[0]
+    budget = 1 / n
+    weights = 1 / np.sqrt(np.diag(covariance))
+    for _ in range(SOLVER_ITERATIONS):
+        previous = weights.copy()
+        for i in range(n):
+            # Positive root of C_ii w_i^2 + (sum_{j != i} C_ij w_j) w_i - budget = 0
+            cross = covariance[i] @ weights - covariance[i, i] * weights[i]
+            weights[i] = (-cross + np.sqrt(cross ** 2 + 4 * covariance[i, i] * budget)) / (2 * covariance[i, i])
+        if np.abs(weights - previous).max() < SOLVER_TOLERANCE:
+            break
+    return weights / weights.sum()
+
+class AllocationEngine:
+    """Cached per-profile allocations over an asset universe"""
+    
+    def __init__(self, expected_returns=ASSET_RETURNS, volatilities=ASSET_VOLATILITY, correlations=ASSET_CORRELATION,
+                 objectives=PROFILE_OBJECTIVES):
+        self.objectives = dict(objectives)
+        self._lock = threading.Lock()
+        self.version = None
+        self.set_market(expected_returns, volatilities, correlations)
+    
+    def set_market(self, expected_returns, volatilities, correlations):
+        """Use these assumptions; a no-op (cache kept) when they are unchanged"""
+        assets = tuple(expected_returns)
+        mu = np.array([expected_returns[asset] for asset in assets], dtype=float)
+        sigma = np.array([volatilities[asset] for asset in assets], dtype=float)
+        covariance = np.outer(sigma, sigma) * np.asarray(correlations, dtype=float)
+        self._set(assets, mu, covariance)
+    
+    def update_from_returns(self, assets, monthly_returns):
+        """Estimate annual returns and covariance from a (months, assets) history of monthly returns"""
+        history = np.asarray(monthly_returns, dtype=float)
+        mu = np.power(1 + history.mean(axis=0), 12) - 1
+        covariance = np.cov(history, rowvar=False) * 12
+        self._set(tuple(assets), mu, covariance)
+    
+    def _set(self, assets, mu, covariance):
+        version = hashlib.sha1(repr((assets, mu.tolist(), covariance.tolist(), sorted(self.objectives.items()))).encode()).hexdigest()[:12]
+        with self._lock:
+            if version == self.version:
+                return
+            # Swapped as one tuple so a concurrent solve never mixes two markets
+            self._market = (assets, mu, covariance, {})
+            self.version = version
+    
+    @property
+    def assets(self):
+        return self._market[0]
+    
+    @property
+    def expected_returns(self):
+        """{asset: expected annual return}"""
+        assets, mu, _, _ = self._market
+        return dict(zip(assets, mu.tolist()))
+    
+    @property
+    def covariance(self):
+        return self._market[2]
+    
+    def _profile(self, risk_profile):
+        key = str(risk_profile or DEFAULT_PROFILE).capitalize()
+        return key if key in self.objectives else DEFAULT_PROFILE
+    
+    def weights(self, risk_profile):
+        """{asset: weight} for a risk profile (unknown profiles get DEFAULT_PROFILE), solved once per market version"""
+        profile = self._profile(risk_profile)
+        assets, mu, covariance, solutions = self._market
+        solution = solutions.get(profile)
+        if solution is None:
+            method, risk_aversion = self.objectives[profile]
+            if method == 'risk_parity':
+                solved = risk_parity_weights(covariance)
+            else:
+                solved = mean_variance_weights(mu, covariance, risk_aversion)
+            solution = dict(zip(assets, solved.tolist()))
+            solutions[profile] = solution
+        return solution
+    
+    def weight_columns(self, risk_profiles, size):
+        """{asset: per-row weight array} for a scalar or per-row array of risk profiles"""
+        profiles = np.broadcast_to(np.asarray(risk_profiles, dtype=object), (size,))
+        unique, inverse = np.unique(profiles.astype(str), return_inverse=True)
+        assets = self.assets
+        table = np.array([[self.weights(profile)[asset] for asset in assets] for profile in unique]).reshape(-1, len(assets))
+        return {asset: table[inverse.reshape(-1), n] for n, asset in enumerate(assets)}
+    
+    def portfolio_stats(self, risk_profile):
+        """(expected annual return, annual volatility) of a profile's allocation"""
+        assets, mu, covariance, _ = self._market
+        w = np.array([self.weights(risk_profile)[asset] for asset in assets])
+        return float(w @ mu), float(np.sqrt(w @ covariance @ w))
+
+ALLOCATION_ENGINE = AllocationEngine()
+
+def allocation_for(risk_profile):
+    """{asset: weight} for a risk profile from the shared engine"""
+    return ALLOCATION_ENGINE.weights(risk_profile)
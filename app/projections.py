@@ -0,0 +1,87 @@
+"""SIP growth projections.
+
+Future value of monthly SIPs per asset class, for arrays of users and
+horizons at once. Level SIPs at a constant rate use the closed-form
+annuity-due formula; step-up SIPs and month-by-month rate paths fall back
+to cumulative products over the schedule.
+"""
+import numpy as np
+
+ASSET_CLASSES = ('equity', 'debt', 'gold')
+# Expected annual return per asset class
+ASSET_RETURNS = {'equity': 0.12, 'debt': 0.07, 'gold': 0.08}
+# Share of monthly savings going to each asset class
+DEFAULT_ALLOCATION = {'equity': 0.6, 'debt': 0.3, 'gold': 0.1}
+
+def monthly_rate(annual_return):
+    """Monthly rate that compounds to annual_return"""
+    return np.power(1 + np.asarray(annual_return, dtype=float), 1 / 12) - 1
+
+def sip_future_value(monthly_sip, annual_return, months):
+    """Value after `months` of a level SIP invested at the start of each month (closed form)"""
+    sip = np.asarray(monthly_sip, dtype=float)
+    rate = monthly_rate(annual_return)
+    months = np.asarray(months, dtype=float)
+    growth = np.power(1 + rate, months)
+    safe_rate = np.where(rate == 0, 1.0, rate)
+    return np.where(rate == 0, sip * months, sip * (growth - 1) / safe_rate * (1 + rate))
+
+def sip_schedule(monthly_sip, annual_return, months, annual_step_up=0.0):
+    """Value at the end of every month, shape (users, months).
+    
+    annual_return is a per-user rate or a (users, months) rate path;
+    annual_step_up raises the SIP by that fraction every 12 months.
+    """
+    sip = np.atleast_1d(np.asarray(monthly_sip, dtype=float))[:, None]
+    rate = monthly_rate(annual_return)
+    t = np.arange(1, months + 1)
+    
+    if rate.ndim < 2 and not annual_step_up:
+        annual_return = np.broadcast_to(np.asarray(annual_return, dtype=float), (sip.shape[0],))[:, None]
+        return sip_future_value(sip, annual_return, t)
+    
+    # B_t = (B_{t-1} + c_t) * (1 + r_t) = G_t * sum_{s<=t} c_s / G_{s-1}, with G_t = prod_{k<=t} (1 + r_k)
+    growth = np.cumprod(np.broadcast_to(1 + (rate if rate.ndim == 2 else rate.reshape(-1, 1)), (sip.shape[0], months)), axis=1)
+    previous_growth = np.concatenate([np.ones((growth.shape[0], 1)), growth[:, :-1]], axis=1)
+    contributions = sip * (1 + annual_step_up) ** ((t - 1) // 12)
+    return growth * np.cumsum(contributions / previous_growth, axis=1)
+
+def _value_at(monthly_sip, annual_return, months, annual_step_up):
+    if not annual_step_up:
+        return sip_future_value(monthly_sip, annual_return, months)
+    schedule = sip_schedule(monthly_sip, annual_return, int(months.max(initial=1)), annual_step_up)
+    value = np.take_along_axis(schedule, np.maximum(months - 1, 0)[:, None].astype(int), axis=1)[:, 0]
+    return np.where(months > 0, value, 0.0)
+
+def project_portfolio(monthly_savings, months, allocation=DEFAULT_ALLOCATION, returns=ASSET_RETURNS, annual_step_up=0.0):
+    """Projected value per asset class plus total, invested and gains, as per-user arrays.
+    
+    allocation maps each asset class to a weight, or to per-user weights.
+    Negative savings are treated as no SIP.
+    """
+    savings = np.maximum(np.atleast_1d(np.asarray(monthly_savings, dtype=float)), 0)
+    months = np.broadcast_to(np.asarray(months, dtype=float), savings.shape)
+    
+    projection = {
+        asset: _value_at(savings * allocation[asset], returns[asset], months, annual_step_up)
+        for asset in allocation
+    }
+    projection['total'] = sum(projection[asset] for asset in allocation)
+    if annual_step_up:
+        # 12 SIPs at each completed step-up level, then the months into the current one
+        years = np.floor_divide(months, 12)
+        level = (1 + annual_step_up) ** years
+        invested = savings * (12 * (level - 1) / annual_step_up + (months - 12 * years) * level)
+    else:
+        invested = savings * months
+    projection['invested'] = invested
+    projection['gains'] = projection['total'] - invested
+    return projection
+
+def portfolio_schedule(monthly_savings, months, allocation=DEFAULT_ALLOCATION, returns=ASSET_RETURNS, annual_step_up=0.0):
+    """Total projected value at the end of every month, shape (users, months)"""
+    savings = np.maximum(np.atleast_1d(np.asarray(monthly_savings, dtype=float)), 0)
+    return sum(
+        sip_schedule(savings * allocation[asset], returns[asset], months, annual_step_up)
+        for asset in allocation
+    )
@@ -0,0 +1,208 @@
+from app import db
+from app.database import ReportIndex, User, dialect_insert
+from app.finance_tools import BatchFinanceAnalyzer
+from datetime import datetime
+from sqlalchemy import delete, select
+import glob
+import json
+import os
+import shutil
+
+REPORTS_DIR = os.path.join('data', 'reports')
+REPORT_BATCH_SIZE = 1000
+MAX_PART_BYTES = 64 * 1024 * 1024
+
+CURRENT_RUN_FILE = 'CURRENT'  # names the run directory a month's reports are read from
+
+def _part_path(run_dir, part):
+    return os.path.join(run_dir, f"part-{part:05d}.ndjson")
+
+def current_run_dir(month, root=REPORTS_DIR):
+    """Run directory holding the published reports of one month (YYYY-MM), or None"""
+    month_dir = os.path.join(root, month)
+    try:
+        with open(os.path.join(month_dir, CURRENT_RUN_FILE), encoding='utf-8') as f:
+            return os.path.join(month_dir, f.read().strip())
+    except FileNotFoundError:
+        # Months written before runs had their own directory keep their parts at the top
+        return month_dir if os.path.isdir(month_dir) else None
+
+def month_parts(month, root=REPORTS_DIR):
+    """Report files of one month's published run, oldest first"""
+    run_dir = current_run_dir(month, root)
+    return sorted(glob.glob(os.path.join(run_dir, 'part-*.ndjson'))) if run_dir else []
+
+class MonthlyReportWriter:
+    """Writes one JSON line per user report to data/reports/<YYYY-MM>/<run>/part-NNNNN.ndjson.
+    
+    Every generation writes a fresh run directory; publish() makes it the
+    month's current run, so re-running a month replaces its reports instead
+    of appending a second line per user. A part is closed and the next one
+    started once it reaches max_bytes, so files stay small enough to read
+    or ship individually.
+    """
+    
+    def __init__(self, month, root=REPORTS_DIR, max_bytes=MAX_PART_BYTES):
+        self.month = month
+        self.month_dir = os.path.join(root, month)
+        self.run = f"run-{datetime.utcnow():%Y%m%dT%H%M%S%f}"
+        self.run_dir = os.path.join(self.month_dir, self.run)
+        self.max_bytes = max_bytes
+        os.makedirs(self.run_dir)
+        self.part = 0
+        self._file = None
+    
+    def _current_file(self):
+        if self._file is not None and self._file.tell() >= self.max_bytes:
+            self._file.close()
+            self._file = None
+            self.part += 1
+        if self._file is None:
+            self._file = open(_part_path(self.run_dir, self.part), 'wb')
+        return self._file
+    
+    def write(self, record):
+        """Append one record; returns (path, offset, length) of its line"""
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        f = self._current_file()
+        offset = f.tell()
+        f.write(line)
+        return f.name, offset, len(line)
+    
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def publish(self):
+        """Make this run the month's current one (atomic rename of the marker)"""
+        self.close()
+        marker = os.path.join(self.month_dir, CURRENT_RUN_FILE)
+        with open(marker + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(self.run)
+        os.replace(marker + '.tmp', marker)
+    
+    def remove_other_runs(self):
+        """Delete the files of every run of the month but this one"""
+        for entry in os.scandir(self.month_dir):
+            if entry.is_dir() and entry.name.startswith('run-') and entry.name != self.run:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            elif entry.is_file() and entry.name.startswith('part-'):
+                os.remove(entry.path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_month_reports(month, root=REPORTS_DIR):
+    """Stream the reports of one month without loading the whole month"""
+    for path in month_parts(month, root):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+def _index_reports(rows):
+    if not rows:
+        return
+    stmt = dialect_insert()(ReportIndex)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ReportIndex.user_id, ReportIndex.month],
+        set_={'path': stmt.excluded.path, 'offset': stmt.excluded.offset, 'length': stmt.excluded.length}
+    )
+    db.session.execute(stmt, rows)
+    db.session.commit()
+
+def _replace_month(writer):
+    """Publish a finished run, drop index rows still pointing at older runs, then their files"""
+    writer.publish()
+    db.session.execute(delete(ReportIndex).where(
+        ReportIndex.month == writer.month,
+        ~ReportIndex.path.startswith(writer.run_dir + os.sep, autoescape=True)
+    ))
+    db.session.commit()
+    writer.remove_other_runs()
+
+def read_reports(entries):
+    """Read the report lines ReportIndex entries point at, one seek each"""
+    reports = []
+    files = {}
+    try:
+        for entry in entries:
+            if entry.path not in files:
+                files[entry.path] = open(entry.path, 'rb')
+            f = files[entry.path]
+            f.seek(entry.offset)
+            reports.append(json.loads(f.read(entry.length)))
+    finally:
+        for f in files.values():
+            f.close()
+    return reports
+
+REPORT_COLUMNS = (
+    User.id, User.name, User.monthly_income, User.monthly_expenses,
+    User.goal_amount, User.goal_months, User.risk_profile
+)
+
+def _rebalance_advice(users):
+    income = [user.monthly_income or 0 for user in users]
+    expenses = [user.monthly_expenses or 0 for user in users]
+    profiles = [user.risk_profile for user in users]
+    return BatchFinanceAnalyzer(income, expenses, goal_amount=0, goal_months=12, emergency_fund=0).get_portfolio_rebalance_advice(profiles)
+
+def _write_batch(writer, month, users, advice, generated_at):
+    """Write and index one batch of users; advice holds arrays aligned with users"""
+    equity, debt, gold = (advice[key].tolist() for key in ('equity_sip', 'debt_sip', 'gold_sip'))
+    index_rows = []
+    for n, user in enumerate(users):
+        income = user.monthly_income or 0
+        expenses = user.monthly_expenses or 0
+        path, offset, length = writer.write({
+            'user_id': user.id,
+            'month': month,
+            'name': user.name,
+            'monthly_income': income,
+            'monthly_expenses': expenses,
+            'monthly_savings': income - expenses,
+            'goal_amount': user.goal_amount,
+            'goal_months': user.goal_months,
+            'risk_profile': user.risk_profile,
+            'suggested_sips': {'equity': equity[n], 'debt': debt[n], 'gold': gold[n]},
+            'timestamp': generated_at
+        })
+        index_rows.append({'user_id': user.id, 'month': month, 'path': path, 'offset': offset, 'length': length})
+    
+    # Lines must be on disk before the index points at them
+    writer.flush()
+    _index_reports(index_rows)
+
+def generate_monthly_reports(month, root=REPORTS_DIR, batch_size=REPORT_BATCH_SIZE):
+    """Write one report line per user for month, batch_size users at a time.
+    
+    Every line is recorded in report_index so a single report can be read
+    with one seek. Memory stays flat in the number of users. Returns the
+    number of reports.
+    """
+    generated_at = datetime.utcnow().isoformat()
+    columns = select(*REPORT_COLUMNS).order_by(User.id).limit(batch_size)
+    
+    written = 0
+    last_id = None
+    with MonthlyReportWriter(month, root) as writer:
+        while True:
+            query = columns if last_id is None else columns.where(User.id > last_id)
+            users = db.session.execute(query).all()
+            if not users:
+                break
+            
+            _write_batch(writer, month, users, _rebalance_advice(users), generated_at)
+            written += len(users)
+            last_id = users[-1].id
+        _replace_month(writer)
+    
+    return written
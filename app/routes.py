@@ -1,9 +1,19 @@
 from flask import Blueprint, request, jsonify
 from app import db
-from app.database import User, Finance, Alert, ChatHistory
+from app.database import User, Finance, Alert, ChatHistory, ReportIndex, JobRun
 from app.agent import FinancialAdvisor
-from app.finance_tools import FinanceAnalyzer
+from app.finance_tools import INSIGHT_CACHE, FinanceAnalyzer
+from app.forecasting import DEFAULT_PATHS
+from app.portfolio import ALLOCATION_ENGINE, allocation_for
+from app.projections import portfolio_schedule
+from app.events import publish_profile_change
+from app.reports import read_reports
 from datetime import datetime
+from sqlalchemy import func
+
+MAX_FORECAST_PATHS = 50000
+MAX_PROJECTION_MONTHS = 600
+MAX_ANNUAL_STEP_UP = 1.0
 
 api_bp = Blueprint('api', __name__)
 
@@ -15,24 +25,14 @@ def create_user():
         risk_profile=data.get('risk_profile', 'Medium'),
         monthly_income=data.get('monthly_income', 0),
         monthly_expenses=data.get('monthly_expenses', 0),
-        monthly_savings_goal=data.get('monthly_savings_goal', 0),
-        expenses_breakdown=data.get('expenses', {}),
+        financial_goal=data.get('financial_goal', ''),
+        goal_amount=data.get('goal_amount', 0),
+        goal_months=data.get('goal_months', 12),
         created_at=datetime.utcnow()
     )
     db.session.add(user)
     db.session.commit()
-    
-    total_expenses = data.get('monthly_expenses', 0)
-    monthly_income = data.get('monthly_income', 0)
-    if monthly_income > 0 and total_expenses > monthly_income * 0.7:
-        alert = Alert(
-            user_id=user.id,
-            message=f"Warning: Your expenses (₹{total_expenses:,.0f}) are {(total_expenses/monthly_income*100):.1f}% of your income.",
-            level='warning',
-            status='unread'
-        )
-        db.session.add(alert)
-        db.session.commit()
+    publish_profile_change(user.id)
     
     return jsonify({'user_id': user.id, 'name': user.name}), 201
 
@@ -48,8 +48,9 @@ def get_user(user_id):
         'risk_profile': user.risk_profile,
         'monthly_income': user.monthly_income,
         'monthly_expenses': user.monthly_expenses,
-        'monthly_savings_goal': user.monthly_savings_goal,
-        'expenses_breakdown': user.expenses_breakdown
+        'financial_goal': user.financial_goal,
+        'goal_amount': user.goal_amount,
+        'goal_months': user.goal_months
     }), 200
 
 @api_bp.route('/users/<int:user_id>', methods=['PUT'])
@@ -61,23 +62,53 @@ def update_user(user_id):
     data = request.json
     user.monthly_income = data.get('monthly_income', user.monthly_income)
     user.monthly_expenses = data.get('monthly_expenses', user.monthly_expenses)
-    user.monthly_savings_goal = data.get('monthly_savings_goal', user.monthly_savings_goal)
-    user.expenses_breakdown = data.get('expenses', user.expenses_breakdown)
+    user.financial_goal = data.get('financial_goal', user.financial_goal)
+    user.goal_amount = data.get('goal_amount', user.goal_amount)
+    user.goal_months = data.get('goal_months', user.goal_months)
     user.risk_profile = data.get('risk_profile', user.risk_profile)
     user.updated_at = datetime.utcnow()
     
-    if user.monthly_income > 0 and user.monthly_expenses > user.monthly_income * 0.75:
-        alert = Alert(
-            user_id=user_id,
-            message=f"Alert: Expenses now at {(user.monthly_expenses/user.monthly_income*100):.1f}% of income. Consider budget adjustments.",
-            level='critical',
-            status='unread'
-        )
-        db.session.add(alert)
-    
     db.session.commit()
+    publish_profile_change(user_id)
+    
     return jsonify({'message': 'User updated successfully'}), 200
 
+@api_bp.route('/forecast/<int:user_id>', methods=['GET'])
+def get_goal_forecast(user_id):
+    """Monte Carlo goal forecast; pass ?seed= for a reproducible result"""
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    paths = max(1, min(request.args.get('paths', DEFAULT_PATHS, type=int), MAX_FORECAST_PATHS))
+    analyzer = FinanceAnalyzer(user.monthly_income, user.monthly_expenses, user.goal_amount, user.goal_months, 0)
+    forecast = analyzer.forecast_goal_probability(user.risk_profile, paths=paths, seed=request.args.get('seed', type=int))
+    forecast['deterministic'] = analyzer.forecast_goal_achievement()
+    return jsonify(forecast), 200
+
+@api_bp.route('/projection/<int:user_id>', methods=['GET'])
+def get_sip_projection(user_id):
+    """SIP growth of monthly savings over the goal horizon (or ?months=), with a yearly schedule"""
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    months = request.args.get('months', user.goal_months, type=int)
+    if months is None:
+        return jsonify({'error': 'months is required when the user has no goal horizon'}), 400
+    months = max(0, min(months, MAX_PROJECTION_MONTHS))
+    # At most doubling the SIP every year; larger or negative step-ups only produce overflow or nonsense
+    step_up = max(0.0, min(request.args.get('step_up', 0.0, type=float), MAX_ANNUAL_STEP_UP))
+    analyzer = FinanceAnalyzer(user.monthly_income, user.monthly_expenses, user.goal_amount, months, 0)
+    projection = analyzer.project_sip_growth(annual_step_up=step_up, risk_profile=user.risk_profile)
+    
+    schedule = portfolio_schedule(analyzer.monthly_savings, months, allocation_for(user.risk_profile),
+                                  ALLOCATION_ENGINE.expected_returns, step_up)[0]
+    projection['yearly_schedule'] = schedule[11::12].round(2).tolist()
+    projection['goal_amount'] = user.goal_amount
+    projection['months'] = months
+    return jsonify(projection), 200
+
 @api_bp.route('/alerts/<int:user_id>', methods=['GET'])
 def get_alerts(user_id):
     alerts = Alert.query.filter_by(user_id=user_id).order_by(Alert.created_at.desc()).all()
@@ -86,7 +117,8 @@ def get_alerts(user_id):
         'message': a.message,
         'level': a.level,
         'status': a.status,
-        'created_at': a.created_at.isoformat()
+        'created_at': a.created_at.isoformat(),
+        'last_seen': a.last_seen.isoformat() if a.last_seen else None
     } for a in alerts]), 200
 
 @api_bp.route('/alerts/<int:user_id>/<int:alert_id>', methods=['PUT'])
@@ -100,6 +132,74 @@ def mark_alert_read(user_id, alert_id):
     db.session.commit()
     return jsonify({'message': 'Alert marked as read'}), 200
 
+@api_bp.route('/reports/<int:user_id>', methods=['GET'])
+def get_report(user_id):
+    """Monthly report for one user: ?month=YYYY-MM, latest month by default"""
+    query = ReportIndex.query.filter_by(user_id=user_id)
+    month = request.args.get('month')
+    if month:
+        query = query.filter_by(month=month)
+    
+    entry = query.order_by(ReportIndex.month.desc()).first()
+    if not entry:
+        return jsonify({'error': 'Report not found'}), 404
+    
+    return jsonify(read_reports([entry])[0]), 200
+
+@api_bp.route('/reports', methods=['GET'])
+def list_reports():
+    """Reports of every user for ?month=YYYY-MM, paged by user id with ?after= and ?limit="""
+    month = request.args.get('month')
+    if not month:
+        return jsonify({'error': 'month is required (YYYY-MM)'}), 400
+    
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    after = request.args.get('after', 0, type=int)
+    entries = ReportIndex.query.filter(ReportIndex.month == month, ReportIndex.user_id > after) \
+        .order_by(ReportIndex.user_id).limit(limit).all()
+    
+    return jsonify({
+        'month': month,
+        'reports': read_reports(entries),
+        'next_after': entries[-1].user_id if len(entries) == limit else None
+    }), 200
+
+@api_bp.route('/admin/jobs', methods=['GET'])
+def list_job_runs():
+    """Recent scheduler job runs, newest first, with the last success of each job"""
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    query = JobRun.query
+    if request.args.get('job'):
+        query = query.filter_by(job=request.args['job'])
+    runs = query.order_by(JobRun.started_at.desc()).limit(limit).all()
+    
+    last_success = db.session.query(JobRun.job, func.max(JobRun.finished_at)) \
+        .filter(JobRun.status == 'success').group_by(JobRun.job).all()
+    
+    return jsonify({
+        'last_success': {job: finished_at.isoformat() for job, finished_at in last_success},
+        'runs': [{
+            'id': r.id,
+            'job': r.job,
+            'status': r.status,
+            'started_at': r.started_at.isoformat(),
+            'finished_at': r.finished_at.isoformat() if r.finished_at else None,
+            'duration_seconds': r.duration_seconds,
+            'users_scanned': r.users_scanned,
+            'alerts_written': r.alerts_written,
+            'rows_processed': r.rows_processed,
+            'rows_per_sec': r.rows_per_sec,
+            'peak_rss_mb': r.peak_rss_mb,
+            'details': r.details,
+            'error': r.error
+        } for r in runs]
+    }), 200
+
+@api_bp.route('/admin/insight-cache', methods=['GET'])
+def insight_cache_stats():
+    """Size and hit rate of the shared generate_insights cache"""
+    return jsonify(INSIGHT_CACHE.stats()), 200
+
 @api_bp.route('/chat/<int:user_id>', methods=['POST'])
 def chat(user_id):
     """Enhanced chat endpoint with AI advisor"""
@@ -118,7 +218,9 @@ def chat(user_id):
     user_data = {
         'monthly_income': user.monthly_income,
         'monthly_expenses': user.monthly_expenses,
-        'monthly_savings_goal': user.monthly_savings_goal,
+        'financial_goal': user.financial_goal,
+        'goal_amount': user.goal_amount,
+        'goal_months': user.goal_months,
         'risk_profile': user.risk_profile
     }
     response = advisor.generate_financial_advice(user_data, [{'role': 'user', 'content': message}])
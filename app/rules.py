@@ -0,0 +1,143 @@
+"""Declarative alert rules.
+
+Every threshold the app alerts on lives here. A rule is a list of
+conditions over named metrics (see BatchFinanceAnalyzer.metrics) plus a
+message template. The same RuleSet evaluates one profile with plain
+Python comparisons or a whole population with NumPy masks, so adding a
+rule never adds a loop over users.
+"""
+import hashlib
+import numpy as np
+import operator
+import string
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+class Condition:
+    """metric <op> threshold, or metric <op> threshold * other metric when `of` is set"""
+    
+    def __init__(self, metric, op, threshold, of=None):
+        self.metric = metric
+        self.op = op
+        self.threshold = threshold
+        self.of = of
+        self._compare = OPERATORS[op]
+    
+    def evaluate(self, metrics):
+        # Works on scalars and arrays alike
+        bound = self.threshold * metrics[self.of] if self.of else self.threshold
+        return self._compare(metrics[self.metric], bound)
+    
+    def __repr__(self):
+        bound = f"{self.threshold} * {self.of}" if self.of else f"{self.threshold}"
+        return f"{self.metric} {self.op} {bound}"
+
+class Rule:
+    """Alert/insight raised when all conditions hold.
+    
+    metric is the value the alert is about (used for fingerprint buckets);
+    group ties the rule to the FinanceAnalyzer method that reports it.
+    """
+    
+    def __init__(self, name, level, group, conditions, template, metric=None):
+        self.name = name
+        self.level = level
+        self.group = group
+        self.conditions = conditions
+        self.template = template
+        self.metric = metric or conditions[0].metric
+        self.fields = [field for _, field, _, _ in string.Formatter().parse(template) if field]
+    
+    def render(self, values):
+        return self.template.format(**values)
+    
+    def __repr__(self):
+        return f"Rule({self.name!r}, {self.level!r}, {self.group!r}, {self.conditions!r}, {self.template!r}, {self.metric!r})"
+
+def _mask(rule, metrics):
+    return np.logical_and.reduce([np.asarray(condition.evaluate(metrics)) for condition in rule.conditions])
+
+class RuleSet:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        # Changes whenever a rule's thresholds, wording or order change
+        self.version = hashlib.sha1(repr(self.rules).encode()).hexdigest()[:12]
+    
+    def select(self, groups):
+        return RuleSet(rule for rule in self.rules if rule.group in groups)
+    
+    def evaluate_scalar(self, metrics):
+        """[(rule, insight)] for one profile given scalar metrics"""
+        return [
+            (rule, {'type': rule.level, 'message': rule.render(metrics)})
+            for rule in self.rules
+            if all(condition.evaluate(metrics) for condition in rule.conditions)
+        ]
+    
+    def masks(self, metrics):
+        """{rule name: boolean mask} over array metrics"""
+        return {rule.name: _mask(rule, metrics) for rule in self.rules}
+    
+    def evaluate_vectorized(self, metrics):
+        """[(row index, rule, value, insight)] for every flagged row, grouped by rule.
+        
+        Only the rows a rule fires on are formatted.
+        """
+        rows = []
+        for rule in self.rules:
+            idx = np.flatnonzero(_mask(rule, metrics))
+            if not idx.size:
+                continue
+            
+            columns = {field: metrics[field][idx].tolist() for field in set(rule.fields) | {rule.metric}}
+            for n, i in enumerate(idx.tolist()):
+                values = {field: column[n] for field, column in columns.items()}
+                rows.append((i, rule, values[rule.metric], {'type': rule.level, 'message': rule.render(values)}))
+        return rows
+
+INSIGHT_RULES = RuleSet([
+    Rule('low_savings_rate', 'warning', 'expenses',
+         [Condition('savings_rate', '<', 20)],
+         'Low savings rate ({savings_rate:.1f}%). Consider increasing SIP or cutting expenses.'),
+    Rule('high_expense_ratio', 'critical', 'expenses',
+         [Condition('monthly_income', '!=', 0), Condition('monthly_expenses', '>', 0.8, of='monthly_income')],
+         'Expenses are {expense_ratio:.1f}% of income. Budget tightening recommended.',
+         metric='expense_ratio'),
+    Rule('emergency_fund_gap', 'warning', 'emergency_fund',
+         [Condition('months_covered', '<', 3)],
+         'Emergency fund covers only {months_covered:.1f} months. Target: 3-6 months. Shortfall: ₹{emergency_shortfall:,.0f}'),
+    Rule('goal_off_track', 'warning', 'goal',
+         [Condition('achievement_rate', '<', 100)],
+         'Goal off track by {goal_gap:.1f}%. Need to save ₹{goal_shortfall:,.0f} more.'),
+])
+
+EXPENSE_RANGE_RULES = RuleSet([
+    Rule('expense_range_critical', 'critical', 'expense_range',
+         [Condition('monthly_income', '>', 0), Condition('expense_ratio', '>', 75)],
+         'Critical: Expenses at {expense_ratio:.1f}% of income (₹{monthly_expenses:,.0f}). Urgent action needed!',
+         metric='expense_ratio'),
+    Rule('expense_range_warning', 'warning', 'expense_range',
+         [Condition('monthly_income', '>', 0), Condition('expense_ratio', '>', 60), Condition('expense_ratio', '<=', 75)],
+         'Warning: Expenses at {expense_ratio:.1f}% of income. Consider budget review.',
+         metric='expense_ratio'),
+])
+
+WEEKLY_RULES = RuleSet([
+    Rule('weekly_savings', 'success', 'weekly',
+         [Condition('monthly_savings', '>', 0)],
+         'Great! You saved ₹{monthly_savings:,.0f} this week. Keep up the momentum!'),
+])
+
+# Everything the daily check and profile-change events alert on
+ALERT_RULES = RuleSet(EXPENSE_RANGE_RULES.rules + INSIGHT_RULES.rules)
+RULES_VERSION = ALERT_RULES.version
+# Profile-change events leave out the emergency fund rule: no fund is on
+# record for a profile, so it would fire on every write
+PROFILE_EVENT_RULES = ALERT_RULES.select(('expense_range', 'expenses', 'goal'))
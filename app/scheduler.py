@@ -1,127 +1,354 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
 from app import db, create_app
-from app.database import User, Finance, Alert
-from app.finance_tools import FinanceAnalyzer
+from app.database import Finance, JobState, Task, User
+from app.alerts import compact_alerts, upsert_alerts
+from app.evaluation import evaluate_profiles, evaluate_rules_set_based, load_profile_columns, profile_alert_rows, run_expense_anomaly_check
+from app.rules import WEEKLY_RULES
+from app.reports import generate_monthly_reports
+from app.pipeline import Pipeline, Stage
+from app.metrics import track_job
+from app.sharding import shard_ranges
+from app.task_queue import enqueue_run, process_tasks, run_exists, run_status, unfinished_runs
+from app.lease import LEASE_RENEW_SECONDS, SCHEDULER_LEASE, lease_holder_id, release_lease, try_acquire_lease
 from datetime import datetime
-import json
+from sqlalchemy import func, select
+import atexit
+import functools
 import logging
+import os
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def daily_financial_check():
-    """Run daily financial analysis and generate alerts - Daily at 9 AM"""
-    app = create_app()
-    with app.app_context():
-        users = User.query.all()
+DAILY_CHECK_JOB_ID = 'daily_check'
+DAILY_CHECK_SHARD_USERS = 50000
+
+# DAILY_CHECK_MODE=spread replaces the 9 AM run with small cohorts checked
+# every SPREAD_SLOT_MINUTES across the window; each user always lands in
+# the same slot.
+DAILY_CHECK_MODE = os.getenv('DAILY_CHECK_MODE', 'batch')
+SPREAD_WINDOW_START_HOUR = int(os.getenv('SPREAD_WINDOW_START_HOUR', 6))
+SPREAD_WINDOW_MINUTES = int(os.getenv('SPREAD_WINDOW_MINUTES', 360))
+SPREAD_SLOT_MINUTES = int(os.getenv('SPREAD_SLOT_MINUTES', 5))
+SPREAD_SLOTS = SPREAD_WINDOW_MINUTES // SPREAD_SLOT_MINUTES
+
+# NIGHTLY_MODE=pipeline runs the daily check and monthly reports as one
+# DAG (build_nightly_pipeline) instead of separate cron jobs. Its alert
+# stages hold the changed users in memory and skip the durable shard queue.
+NIGHTLY_MODE = os.getenv('NIGHTLY_MODE', 'jobs')
+
+# Flask config overrides for the job app, set by start_scheduler
+_job_app_config = {}
+_job_app_instance = None
+_job_app_lock = threading.Lock()
+
+def _job_app():
+    """The Flask app shared by every job run.
+    
+    Built once per process so jobs reuse one engine and its connection pool;
+    each job gets its own pooled session from app_context().
+    """
+    global _job_app_instance
+    with _job_app_lock:
+        if _job_app_instance is None:
+            _job_app_instance = create_app(_job_app_config)
+        return _job_app_instance
+
+def _get_watermark(job_id):
+    state = db.session.get(JobState, job_id)
+    return state.high_water_mark if state else None
+
+def _set_watermark(job_id, high_water_mark):
+    state = db.session.get(JobState, job_id) or JobState(job_id=job_id)
+    state.high_water_mark = high_water_mark
+    state.last_success = datetime.utcnow()
+    db.session.add(state)
+    db.session.commit()
+
+def run_daily_financial_check(full_rescan=False, cohort=None):
+    """Set-based daily check; needs an app context.
+    
+    Only users changed since the last successful run are re-evaluated
+    unless full_rescan is set or the job has never completed. With
+    cohort=(slot, slots) only that slot's users are checked, against a
+    watermark of their own.
+    """
+    run_started = datetime.utcnow()
+    job_id = DAILY_CHECK_JOB_ID if cohort is None else f"{DAILY_CHECK_JOB_ID}:{cohort[0]}/{cohort[1]}"
+    changed_since = None if full_rescan else _get_watermark(job_id)
+    
+    users_checked, alerts_written = evaluate_profiles(changed_since=changed_since, seen_at=run_started, cohort=cohort)
+    
+    # Changes made while this run was reading are picked up next time
+    _set_watermark(job_id, run_started)
+    return users_checked, alerts_written
+
+def _daily_check_shard(payload):
+    """Task handler: daily check for users lo <= id < hi of one queued run"""
+    changed_since = payload.get('changed_since')
+    return evaluate_profiles(
+        changed_since=datetime.fromisoformat(changed_since) if changed_since else None,
+        seen_at=datetime.fromisoformat(payload['run_started']),
+        id_range=(payload['lo'], payload['hi'])
+    )
+
+def _enqueue_daily_check(run_id, full_rescan):
+    run_started = datetime.utcnow()
+    changed_since = None if full_rescan else _get_watermark(DAILY_CHECK_JOB_ID)
+    lo, hi = db.session.execute(select(func.min(User.id), func.max(User.id))).one()
+    shards = -(-(hi - lo + 1) // DAILY_CHECK_SHARD_USERS) if lo is not None else 1
+    
+    enqueue_run(DAILY_CHECK_JOB_ID, run_id, [{
+        'lo': shard_lo,
+        'hi': shard_hi,
+        'changed_since': changed_since.isoformat() if changed_since else None,
+        'run_started': run_started.isoformat()
+    } for shard_lo, shard_hi in shard_ranges(lo, hi, shards) or [(0, 0)]])
+
+def _finish_daily_run(run_id):
+    """Advance the watermark once every shard of the run is done"""
+    status = run_status(run_id)
+    if not status or set(status) != {'done'}:
+        return False
+    
+    task = Task.query.filter_by(run_id=run_id).first()
+    run_started = datetime.fromisoformat(task.payload['run_started'])
+    current = _get_watermark(DAILY_CHECK_JOB_ID)
+    if current is None or run_started > current:
+        _set_watermark(DAILY_CHECK_JOB_ID, run_started)
+    return True
+
+# Handlers for shard tasks left in the durable queue, by job
+TASK_HANDLERS = {DAILY_CHECK_JOB_ID: (_daily_check_shard, _finish_daily_run)}
+
+def daily_financial_check(full_rescan=False):
+    """Run daily financial analysis and generate alerts - Daily at 9 AM
+    
+    The run is split into shard tasks in the durable queue, so a crash
+    part-way through resumes from the unfinished shards.
+    """
+    app = _job_app()
+    with app.app_context(), track_job(DAILY_CHECK_JOB_ID) as metrics:
+        run_id = f"{DAILY_CHECK_JOB_ID}:{datetime.utcnow().date().isoformat()}{':full' if full_rescan else ''}"
+        if not run_exists(run_id):
+            _enqueue_daily_check(run_id, full_rescan)
         
-        for user in users:
-            analyzer = FinanceAnalyzer(
-                monthly_income=user.monthly_income,
-                monthly_expenses=user.monthly_expenses,
-                goal_amount=0,
-                goal_months=12,
-                emergency_fund=0
-            )
-            
-            insights = analyzer.generate_insights()
-            
-            if user.monthly_income > 0:
-                expense_percentage = (user.monthly_expenses / user.monthly_income) * 100
-                if expense_percentage > 75:
-                    alert = Alert(
-                        user_id=user.id,
-                        message=f"Critical: Expenses at {expense_percentage:.1f}% of income (₹{user.monthly_expenses:,.0f}). Urgent action needed!",
-                        level='critical',
-                        status='unread'
-                    )
-                    db.session.add(alert)
-                elif expense_percentage > 60:
-                    alert = Alert(
-                        user_id=user.id,
-                        message=f"Warning: Expenses at {expense_percentage:.1f}% of income. Consider budget review.",
-                        level='warning',
-                        status='unread'
-                    )
-                    db.session.add(alert)
-            
-            for insight in insights:
-                alert = Alert(
-                    user_id=user.id,
-                    message=insight['message'],
-                    level=insight['type'],
-                    status='unread'
-                )
-                db.session.add(alert)
-            
-            db.session.commit()
-            logger.info(f"✅ Daily check completed for user {user.id}")
+        results = process_tasks(DAILY_CHECK_JOB_ID, _daily_check_shard, lease_holder_id())
+        finished = _finish_daily_run(run_id)
+        metrics.users_scanned = sum(users for users, _ in results)
+        metrics.alerts_written = sum(alerts for _, alerts in results)
+        metrics.details = {'run_id': run_id, 'shards_processed': len(results), 'shards': run_status(run_id)}
+        logger.info(f"✅ Daily check {run_id}: {len(results)} shards processed, {run_status(run_id)}"
+                    f"{'' if finished else ' (unfinished shards will be retried)'}")
+
+def drain_task_queue():
+    """Run shard tasks left over from crashed or retrying runs - Every minute and at startup"""
+    app = _job_app()
+    with app.app_context():
+        holder = lease_holder_id()
+        for job, (handler, finish) in TASK_HANDLERS.items():
+            run_ids = unfinished_runs(job)
+            if not run_ids:
+                continue
+            with track_job(f"{job}:resume") as metrics:
+                results = process_tasks(job, handler, holder)
+                for run_id in run_ids:
+                    finish(run_id)
+                metrics.rows_processed = len(results)
+                metrics.details = {'run_ids': run_ids}
+            logger.info(f"✅ Resumed {len(results)} queued {job} shards")
+
+def current_spread_slot(now=None):
+    """Slot of the spread window `now` falls in, or None outside the window"""
+    now = now or datetime.now()
+    # Minutes since the window last opened, so a window may run past midnight
+    minutes = ((now.hour - SPREAD_WINDOW_START_HOUR) * 60 + now.minute) % (24 * 60)
+    if not 0 <= minutes < SPREAD_WINDOW_MINUTES:
+        return None
+    return minutes // SPREAD_SLOT_MINUTES
+
+def daily_check_cohort():
+    """Daily check for the users hashed into the current slot - every slot across the spread window"""
+    slot = current_spread_slot()
+    if slot is None:
+        return
+    
+    app = _job_app()
+    with app.app_context(), track_job(f"{DAILY_CHECK_JOB_ID}:cohort") as metrics:
+        users_checked, alerts_written = run_daily_financial_check(cohort=(slot, SPREAD_SLOTS))
+        metrics.users_scanned, metrics.alerts_written = users_checked, alerts_written
+        metrics.details = {'slot': slot, 'slots': SPREAD_SLOTS}
+        logger.info(f"✅ Daily check cohort {slot + 1}/{SPREAD_SLOTS}: {users_checked} users ({alerts_written} alerts)")
 
 def weekly_goal_monitor():
     """Monitor goal progress weekly - Every Monday at 10 AM"""
-    app = create_app()
-    with app.app_context():
-        users = User.query.all()
-        
-        for user in users:
-            monthly_savings = user.monthly_income - user.monthly_expenses
-            
-            if monthly_savings > 0:
-                alert = Alert(
-                    user_id=user.id,
-                    message=f"Great! You saved ₹{monthly_savings:,.0f} this week. Keep up the momentum!",
-                    level='success',
-                    status='unread'
-                )
-                db.session.add(alert)
-        
-        db.session.commit()
-        logger.info("✅ Weekly goal monitoring completed")
+    app = _job_app()
+    with app.app_context(), track_job('weekly_monitor') as metrics:
+        alerts_written = evaluate_rules_set_based(WEEKLY_RULES)
+        metrics.users_scanned = db.session.execute(select(func.count(User.id))).scalar()
+        metrics.alerts_written = alerts_written
+        logger.info(f"✅ Weekly goal monitoring completed ({alerts_written} alerts)")
+
+def expense_trend_check():
+    """Score every user's latest expense against their history across worker processes - Daily at 9:30 AM"""
+    app = _job_app()
+    with app.app_context(), track_job('expense_trend_check') as metrics:
+        # Replaces the two-row spike check; running both would raise two alerts for one jump
+        shards, alerts_written = run_expense_anomaly_check()
+        metrics.users_scanned = db.session.execute(select(func.count(func.distinct(Finance.user_id)))).scalar()
+        metrics.alerts_written = alerts_written
+        metrics.details = {'shards': shards}
+        logger.info(f"✅ Expense anomaly check completed over {shards} shards ({alerts_written} alerts)")
+
+def _refresh_aggregates(inputs):
+    """Load the profiles changed since the daily check's watermark once for the downstream stages.
+    
+    Only five NumPy columns are held per user, and only for changed users
+    once the check has completed a run.
+    """
+    run_started = datetime.utcnow()
+    changed_since = _get_watermark(DAILY_CHECK_JOB_ID)
+    return {'columns': load_profile_columns(changed_since=changed_since), 'seen_at': run_started}
+
+def _evaluate_rules(inputs):
+    aggregates = inputs['refresh_aggregates']
+    return profile_alert_rows(*aggregates['columns'], aggregates['seen_at'])
+
+def _generate_alerts(inputs):
+    written = upsert_alerts(inputs['evaluate_rules'])
+    # Same watermark as the daily check: a failed run is redone from where the last one succeeded
+    _set_watermark(DAILY_CHECK_JOB_ID, inputs['refresh_aggregates']['seen_at'])
+    return written
+
+def _write_monthly_reports(inputs):
+    # Monthly reports only go out on the 1st; keyset batches keep memory flat
+    now = datetime.utcnow()
+    if now.day != 1:
+        return 0
+    return generate_monthly_reports(now.strftime('%Y-%m'))
+
+def build_nightly_pipeline(app):
+    """refresh aggregates -> rules -> alerts, with monthly reports alongside.
+    
+    The alert stages cover the users changed since the daily check's
+    watermark, in memory and without the durable shard queue: a crash
+    re-runs the whole changed set on the next night rather than resuming
+    shards. Reports read users in batches straight from the database.
+    """
+    return Pipeline('nightly', [
+        Stage('refresh_aggregates', _refresh_aggregates),
+        Stage('evaluate_rules', _evaluate_rules, after=['refresh_aggregates']),
+        Stage('generate_alerts', _generate_alerts, after=['refresh_aggregates', 'evaluate_rules']),
+        Stage('write_monthly_reports', _write_monthly_reports),
+    ], context=app.app_context)
+
+def nightly_pipeline():
+    """Daily check and monthly reports as one pipeline - Daily at 9 AM (NIGHTLY_MODE=pipeline)"""
+    app = _job_app()
+    with app.app_context(), track_job('nightly_pipeline') as metrics:
+        results, timings = build_nightly_pipeline(app).run()
+        users = len(results['refresh_aggregates']['columns'][0])
+        metrics.users_scanned = users
+        metrics.alerts_written = results['generate_alerts']
+        metrics.details = {'stage_seconds': timings, 'reports_written': results['write_monthly_reports']}
+    logger.info(f"✅ Nightly pipeline completed in {sum(timings.values()):.2f}s of stage time: "
+                f"{users} changed users, {results['generate_alerts']} alerts, "
+                f"{results['write_monthly_reports']} reports")
+
+def alert_compaction():
+    """Move read and stale alerts out of the hot table - Daily at 3 AM"""
+    app = _job_app()
+    with app.app_context(), track_job('alert_compaction') as metrics:
+        archived = compact_alerts()
+        metrics.rows_processed = archived
+        logger.info(f"✅ Alert compaction archived {archived} alerts")
 
 def monthly_report_generation():
     """Generate comprehensive monthly reports - 1st of each month at 12 PM"""
-    app = create_app()
+    app = _job_app()
+    with app.app_context(), track_job('monthly_report') as metrics:
+        month = datetime.utcnow().strftime('%Y-%m')
+        written = generate_monthly_reports(month)
+        metrics.users_scanned = written
+        metrics.details = {'month': month}
+        logger.info(f"✅ Monthly report generated for {written} users ({month})")
+
+def _hold_scheduler_lease(app, holder):
+    """Take or renew the scheduler lease; runs on every process's heartbeat"""
     with app.app_context():
-        report_data = {}
-        users = User.query.all()
-        
-        for user in users:
-            monthly_savings = user.monthly_income - user.monthly_expenses
-            
-            report_data[f"user_{user.id}"] = {
-                'name': user.name,
-                'monthly_income': f"₹{user.monthly_income:,.0f}",
-                'monthly_expenses': f"₹{user.monthly_expenses:,.0f}",
-                'monthly_savings': f"₹{monthly_savings:,.0f}",
-                'monthly_savings_goal': f"₹{user.monthly_savings_goal:,.0f}",
-                'risk_profile': user.risk_profile,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-        
-        import os
-        os.makedirs('data', exist_ok=True)
-        
-        with open('data/agent_logs.json', 'a') as f:
-            json.dump(report_data, f, indent=2)
-            f.write('\n')
-        
-        logger.info(f"✅ Monthly report generated for {len(users)} users")
+        return try_acquire_lease(SCHEDULER_LEASE, holder)
 
-def start_scheduler():
-    """Initialize and start the background scheduler with agentic tasks"""
-    scheduler = BackgroundScheduler()
+def _leader_only(job, app, holder):
+    """Run job only in the process currently holding the scheduler lease"""
+    @functools.wraps(job)
+    def run(*args, **kwargs):
+        if not _hold_scheduler_lease(app, holder):
+            logger.info(f"Skipping {job.__name__}: scheduler lease held by another process")
+            return None
+        return job(*args, **kwargs)
+    return run
+
+def _release_scheduler_lease(app, holder):
+    with app.app_context():
+        release_lease(SCHEDULER_LEASE, holder)
+
+def start_scheduler(blocking=False, config=None):
+    """Initialize and start the scheduler with agentic tasks.
     
-    scheduler.add_job(daily_financial_check, 'cron', hour=9, minute=0, 
-                     id='daily_check', name='Daily Financial Check')
-    scheduler.add_job(weekly_goal_monitor, 'cron', day_of_week='mon', hour=10, minute=0,
+    Every process that starts a scheduler competes for the scheduler lease
+    and jobs only run in the one holding it; the others take over once the
+    leader stops renewing it. With blocking=True this call runs the
+    scheduler in the current thread until shutdown (see app.worker).
+    config overrides the Flask config of the app the jobs run in.
+    """
+    if NIGHTLY_MODE != 'pipeline' and DAILY_CHECK_MODE == 'spread' and 60 % SPREAD_SLOT_MINUTES:
+        # The */N minute cron restarts at every hour, so other slot lengths would skip or repeat cohorts
+        raise ValueError(f"SPREAD_SLOT_MINUTES must divide 60, got {SPREAD_SLOT_MINUTES}")
+    if NIGHTLY_MODE != 'pipeline' and DAILY_CHECK_MODE == 'spread' and not 0 < SPREAD_WINDOW_MINUTES <= 24 * 60:
+        raise ValueError(f"SPREAD_WINDOW_MINUTES must be between 1 and {24 * 60}, got {SPREAD_WINDOW_MINUTES}")
+    _job_app_config.update(config or {})
+    scheduler = BlockingScheduler() if blocking else BackgroundScheduler()
+    lease_app = _job_app()
+    holder = lease_holder_id()
+    
+    scheduler.add_job(_hold_scheduler_lease, 'interval', seconds=LEASE_RENEW_SECONDS, args=[lease_app, holder],
+                     next_run_time=datetime.now(), id='scheduler_lease', name='Scheduler Lease Heartbeat')
+    scheduler.add_job(_leader_only(drain_task_queue, lease_app, holder), 'interval', minutes=1,
+                     next_run_time=datetime.now(), id='task_queue', name='Task Queue Drain')
+    if NIGHTLY_MODE == 'pipeline':
+        scheduler.add_job(_leader_only(nightly_pipeline, lease_app, holder), 'cron', hour=9, minute=0,
+                         id='nightly_pipeline', name='Nightly Pipeline')
+    elif DAILY_CHECK_MODE == 'spread':
+        scheduler.add_job(_leader_only(daily_check_cohort, lease_app, holder), 'cron', minute=f'*/{SPREAD_SLOT_MINUTES}',
+                         id=DAILY_CHECK_JOB_ID, name='Daily Financial Check (spread)')
+    else:
+        scheduler.add_job(_leader_only(daily_financial_check, lease_app, holder), 'cron', hour=9, minute=0, 
+                         id=DAILY_CHECK_JOB_ID, name='Daily Financial Check')
+    scheduler.add_job(_leader_only(weekly_goal_monitor, lease_app, holder), 'cron', day_of_week='mon', hour=10, minute=0,
                      id='weekly_monitor', name='Weekly Goal Monitor')
-    scheduler.add_job(monthly_report_generation, 'cron', day=1, hour=12, minute=0,
-                     id='monthly_report', name='Monthly Report Generation')
+    if NIGHTLY_MODE != 'pipeline':
+        scheduler.add_job(_leader_only(monthly_report_generation, lease_app, holder), 'cron', day=1, hour=12, minute=0,
+                         id='monthly_report', name='Monthly Report Generation')
+    scheduler.add_job(_leader_only(alert_compaction, lease_app, holder), 'cron', hour=3, minute=0,
+                     id='alert_compaction', name='Alert Compaction')
+    scheduler.add_job(_leader_only(expense_trend_check, lease_app, holder), 'cron', hour=9, minute=30,
+                     id='expense_trend_check', name='Expense Trend Check')
     
-    scheduler.start()
-    logger.info("✅ Scheduler started with 3 autonomous agentic background tasks:")
-    logger.info("   - Daily Financial Check (9 AM) - with expense range alerts")
+    atexit.register(_release_scheduler_lease, lease_app, holder)
+    logger.info(f"✅ Scheduler starting as {holder} with 5 autonomous agentic background tasks:")
+    if NIGHTLY_MODE == 'pipeline':
+        logger.info("   - Nightly Pipeline (9 AM) - aggregates, rules, alerts, advice, monthly reports on the 1st")
+    elif DAILY_CHECK_MODE == 'spread':
+        logger.info(f"   - Daily Financial Check ({SPREAD_SLOTS} cohorts from {SPREAD_WINDOW_START_HOUR}:00, every {SPREAD_SLOT_MINUTES} min)")
+    else:
+        logger.info("   - Daily Financial Check (9 AM) - with expense range alerts")
     logger.info("   - Weekly Goal Monitor (Monday 10 AM)")
-    logger.info("   - Monthly Report Generation (1st of month 12 PM)")
+    if NIGHTLY_MODE != 'pipeline':
+        logger.info("   - Monthly Report Generation (1st of month 12 PM)")
+    logger.info("   - Alert Compaction (3 AM)")
+    logger.info("   - Expense Trend Check (9:30 AM)")
+    scheduler.start()
     
     return scheduler
@@ -0,0 +1,55 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import create_engine
+import multiprocessing
+import os
+
+DEFAULT_WORKERS = int(os.getenv('SCHEDULER_WORKERS', os.cpu_count() or 1))
+SHARDS_PER_WORKER = 4
+
+# Each pool process opens its own engine; nothing is shared with the parent
+_worker_engine = None
+
+def _init_worker(database_uri):
+    global _worker_engine
+    _worker_engine = create_engine(database_uri)
+
+def _run_shard(task, lo, hi):
+    with _worker_engine.connect() as connection:
+        return task(connection, lo, hi)
+
+def shard_ranges(min_id, max_id, shards):
+    """Split the inclusive id range [min_id, max_id] into at most `shards` half-open ranges"""
+    if min_id is None or max_id is None:
+        return []
+    span = max_id - min_id + 1
+    shards = max(1, min(shards, span))
+    bounds = [min_id + span * i // shards for i in range(shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def run_sharded(task, database_uri, id_range, workers=DEFAULT_WORKERS, shards=None):
+    """Run task(connection, lo, hi) over shards of id_range and yield each shard's result.
+    
+    Shards run in a pool of `workers` processes (spawned, so no engine or
+    scheduler thread state is inherited), several shards per worker so a
+    slow shard does not leave cores idle. Results arrive in completion
+    order; the caller merges them and does the single bulk write. task must
+    be a picklable top-level function (or functools.partial of one).
+    """
+    ranges = shard_ranges(*id_range, shards or workers * SHARDS_PER_WORKER)
+    
+    if workers <= 1:
+        engine = create_engine(database_uri)
+        try:
+            for lo, hi in ranges:
+                with engine.connect() as connection:
+                    yield task(connection, lo, hi)
+        finally:
+            engine.dispose()
+        return
+    
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(database_uri,)) as pool:
+        futures = [pool.submit(_run_shard, task, lo, hi) for lo, hi in ranges]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,152 @@
+from app import db
+from app.database import Task, dialect_insert
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import OperationalError
+import threading
+import uuid
+
+# Well above the slowest shard seen (a 50k-user daily check shard takes seconds);
+# running shards also renew it every TASK_RENEW_SECONDS, so it only runs out
+# once the worker is gone.
+TASK_LEASE_SECONDS = 1800
+TASK_RENEW_SECONDS = 300
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+
+def enqueue_run(job, run_id, payloads):
+    """Create one pending task per shard payload; re-enqueueing a run is a no-op"""
+    rows = [{'job': job, 'run_id': run_id, 'shard': shard, 'payload': payload, 'status': 'pending',
+             'attempts': 0, 'next_run_at': datetime.utcnow(), 'created_at': datetime.utcnow()}
+            for shard, payload in enumerate(payloads)]
+    if rows:
+        db.session.execute(dialect_insert()(Task).on_conflict_do_nothing(index_elements=[Task.run_id, Task.shard]), rows)
+    db.session.commit()
+
+def run_exists(run_id):
+    return db.session.execute(select(Task.id).where(Task.run_id == run_id).limit(1)).first() is not None
+
+def _claimable(job, now):
+    # Pending and due, or running under a lease its holder let expire (crashed mid-shard)
+    return and_(
+        Task.job == job,
+        or_(
+            and_(Task.status == 'pending', Task.next_run_at <= now),
+            and_(Task.status == 'running', Task.lease_until < now)
+        )
+    )
+
+def claim_task(job, holder, lease_seconds=TASK_LEASE_SECONDS):
+    """Lease the next runnable task of job to holder; None when nothing is due"""
+    while True:
+        now = datetime.utcnow()
+        task_id = db.session.execute(
+            select(Task.id).where(_claimable(job, now)).order_by(Task.next_run_at, Task.id).limit(1)
+        ).scalar()
+        if task_id is None:
+            db.session.commit()
+            return None
+        
+        # Conditional update so two claimers can never both win the same task
+        claimed = db.session.execute(
+            update(Task)
+            .where(Task.id == task_id, _claimable(job, now))
+            .values(status='running', holder=holder, lease_until=now + timedelta(seconds=lease_seconds))
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Task, task_id)
+
+def renew_task(connection, task_id, holder, lease_seconds=TASK_LEASE_SECONDS):
+    """Push a running task's lease forward; False if holder no longer owns it"""
+    renewed = connection.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.holder == holder, Task.status == 'running')
+        .values(lease_until=datetime.utcnow() + timedelta(seconds=lease_seconds))
+    ).rowcount
+    return bool(renewed)
+
+def _renew_until(stop, engine, task_id, holder):
+    # Own connection, so renewals never touch the session the handler is using
+    while not stop.wait(TASK_RENEW_SECONDS):
+        try:
+            with engine.begin() as connection:
+                if not renew_task(connection, task_id, holder):
+                    return
+        except OperationalError:
+            # Database busy (e.g. SQLite locked by the shard's own write); try again next beat
+            continue
+
+def complete_task(task, holder):
+    """Mark the task done; False if holder lost the lease and someone else owns it"""
+    done = db.session.execute(
+        update(Task)
+        .where(Task.id == task.id, Task.holder == holder, Task.status == 'running')
+        .values(status='done', completed_at=datetime.utcnow(), lease_until=None, error=None)
+    ).rowcount
+    db.session.commit()
+    return bool(done)
+
+def fail_task(task, holder, error, max_attempts=MAX_ATTEMPTS):
+    """Schedule a retry with exponential backoff, or give up after max_attempts"""
+    attempts = (task.attempts or 0) + 1
+    retry = attempts < max_attempts
+    db.session.execute(
+        update(Task)
+        .where(Task.id == task.id, Task.holder == holder, Task.status == 'running')
+        .values(
+            status='pending' if retry else 'failed',
+            attempts=attempts,
+            error=error,
+            lease_until=None,
+            next_run_at=datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        )
+    )
+    db.session.commit()
+
+def run_status(run_id):
+    """{status: shard count} for one run"""
+    rows = db.session.execute(
+        select(Task.status, func.count()).where(Task.run_id == run_id).group_by(Task.status)
+    ).all()
+    return dict(rows)
+
+def unfinished_runs(job):
+    """Runs of job with shards still pending or running"""
+    return db.session.execute(
+        select(Task.run_id).where(Task.job == job, Task.status.in_(('pending', 'running'))).distinct()
+    ).scalars().all()
+
+def process_tasks(job, handler, holder):
+    """Claim and run due tasks of job until none are left.
+    
+    handler(payload) does the work of one shard. A shard that raises is
+    retried later with backoff; a shard whose worker died is re-claimed
+    once its lease expires. The lease is renewed in the background while
+    the handler runs. Each call claims under its own holder id, so two
+    calls in one process never complete or fail each other's shards.
+    Returns the handler results of the shards this call completed.
+    """
+    holder = f"{holder}:{uuid.uuid4().hex[:8]}"
+    results = []
+    while True:
+        task = claim_task(job, holder)
+        if task is None:
+            return results
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_renew_until, args=(stop, db.engine, task.id, holder), daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(task.payload)
+            error = None
+        except Exception as e:
+            error = repr(e)
+        finally:
+            stop.set()
+            heartbeat.join()
+        if error is not None:
+            db.session.rollback()
+            fail_task(task, holder, error)
+            continue
+        if complete_task(task, holder):
+            results.append(result)
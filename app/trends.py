@@ -0,0 +1,151 @@
+"""Expense trends.
+
+A TrendTracker folds one Finance row at a time into a handful of numbers
+(last two values, EWMA and exponentially weighted variance, running mean
+and variance), so spike checks never re-read a user's history.
+rolling_anomaly_scores scores many users' rows at once against each
+user's preceding window, for the population-wide anomaly check.
+"""
+import math
+import numpy as np
+
+EWMA_ALPHA = 0.3  # weight of the newest value in the EWMA
+SPIKE_THRESHOLD_PERCENT = 15
+
+ANOMALY_WINDOW = 6  # preceding rows each value is scored against
+ANOMALY_MIN_HISTORY = 3  # fewer preceding rows than this are never scored
+ZSCORE_THRESHOLD = 3.0
+ROBUST_THRESHOLD = 3.5  # modified z-score (Iglewicz & Hoaglin)
+MAD_SCALE = 0.6745  # makes the MAD comparable to a standard deviation
+
+TREND_FIELDS = ('count', 'last_value', 'last_at', 'previous_value', 'previous_at', 'ewma', 'ewm_var', 'mean', 'm2')
+
+class TrendTracker:
+    """O(1) expense trend state for one user; mirrors the TrendState columns"""
+    
+    def __init__(self, count=0, last_value=None, last_at=None, previous_value=None, previous_at=None,
+                 ewma=None, ewm_var=0.0, mean=0.0, m2=0.0):
+        self.count = count
+        self.last_value = last_value
+        self.last_at = last_at
+        self.previous_value = previous_value
+        self.previous_at = previous_at
+        self.ewma = ewma
+        self.ewm_var = ewm_var
+        self.mean = mean
+        self.m2 = m2
+    
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{field: row[field] for field in TREND_FIELDS})
+    
+    def as_row(self, user_id):
+        return {'user_id': user_id, **{field: getattr(self, field) for field in TREND_FIELDS}}
+    
+    def update(self, value, timestamp):
+        """Fold in one expense value.
+        
+        last/previous follow timestamp order (ties go to the newer row), so a
+        backdated row only moves them if it lands between the two. The
+        averages follow arrival order.
+        """
+        value = float(value or 0)
+        if self.last_at is None or timestamp >= self.last_at:
+            self.previous_value, self.previous_at = self.last_value, self.last_at
+            self.last_value, self.last_at = value, timestamp
+        elif self.previous_at is None or timestamp >= self.previous_at:
+            self.previous_value, self.previous_at = value, timestamp
+        
+        # Welford's running mean and sum of squared deviations
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            diff = value - self.ewma
+            increment = EWMA_ALPHA * diff
+            self.ewma += increment
+            self.ewm_var = (1 - EWMA_ALPHA) * (self.ewm_var + diff * increment)
+        return self
+    
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+    
+    @property
+    def ewm_std(self):
+        return math.sqrt(self.ewm_var)
+    
+    def change_percent(self):
+        """Latest value versus the one before it, in percent"""
+        if self.previous_value is None:
+            return None
+        return (self.last_value - self.previous_value) / self.previous_value * 100 if self.previous_value > 0 else 0
+    
+    def spike(self):
+        """Same result as calculate_monthly_trends over the rows folded in so far"""
+        change = self.change_percent()
+        if change is None:
+            return {}
+        if abs(change) > SPIKE_THRESHOLD_PERCENT:
+            return {
+                'spike_detected': True,
+                'change_percent': change,
+                'message': f"Expense spike detected: {change:+.1f}% (₹{self.last_value:,.0f})"
+            }
+        return {'spike_detected': False}
+
+def rolling_anomaly_scores(user_ids, values, rows=None, window=ANOMALY_WINDOW):
+    """Score rows against the `window` rows before them for the same user.
+    
+    user_ids and values must be sorted by user, then time. rows selects
+    which row indices to score (default all). Returns a dict of arrays over
+    those rows: history (rows in the window), mean, std, zscore, median,
+    mad, robust_score and anomaly. Scores are NaN where the window is too
+    short (or, for robust_score, has no spread).
+    """
+    user_ids = np.asarray(user_ids)
+    values = np.asarray(values, dtype=float)
+    index = np.arange(values.size)
+    rows = index if rows is None else np.asarray(rows, dtype=int)
+    
+    # Position of every row within its user's run
+    starts = np.r_[True, user_ids[1:] != user_ids[:-1]] if values.size else np.zeros(0, dtype=bool)
+    position = index - np.maximum.accumulate(np.where(starts, index, 0))
+    
+    lags = np.arange(1, window + 1)
+    valid = lags[None, :] <= position[rows][:, None]
+    windows = np.where(valid, values[np.maximum(rows[:, None] - lags[None, :], 0)], np.nan)
+    history = valid.sum(axis=1)
+    current = values[rows]
+    
+    nan = np.full(rows.size, np.nan)
+    mean, std, median, mad = nan.copy(), nan.copy(), nan.copy(), nan.copy()
+    scored = history >= ANOMALY_MIN_HISTORY
+    if scored.any():
+        window_values = windows[scored]
+        mean[scored] = np.nanmean(window_values, axis=1)
+        std[scored] = np.nanstd(window_values, axis=1, ddof=1)
+        median[scored] = np.nanmedian(window_values, axis=1)
+        mad[scored] = np.nanmedian(np.abs(window_values - median[scored][:, None]), axis=1)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # A jump off a perfectly flat window is infinitely unusual
+        zscore = np.where(std > 0, (current - mean) / std, np.sign(current - mean) * np.inf)
+        robust_score = np.where(mad > 0, MAD_SCALE * (current - median) / mad, np.nan)
+    # The robust score decides when it exists; a flat window (MAD 0) falls back to the z-score
+    anomaly = np.where(np.isnan(robust_score), zscore > ZSCORE_THRESHOLD, robust_score > ROBUST_THRESHOLD)
+    
+    return {
+        'history': history,
+        'mean': mean,
+        'std': std,
+        'zscore': zscore,
+        'median': median,
+        'mad': mad,
+        'robust_score': robust_score,
+        'anomaly': anomaly,
+    }
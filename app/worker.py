@@ -0,0 +1,32 @@
+"""Standalone scheduler worker: python -m app.worker
+
+Runs the jobs from app.scheduler in their own process, with their own
+engine and connection pool, so nightly batch work never competes with
+request handling for the GIL. Web and worker processes scale separately.
+"""
+from app.scheduler import start_scheduler
+import logging
+import signal
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Jobs run one or two at a time, so the worker needs only a small pool
+WORKER_CONFIG = {
+    'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 2, 'max_overflow': 2, 'pool_pre_ping': True}
+}
+
+def _exit_on_sigterm(signum, frame):
+    # Turn SIGTERM into SystemExit so the scheduler shuts down and atexit releases the lease
+    sys.exit(0)
+
+def main():
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    logger.info("✅ Starting scheduler worker")
+    try:
+        start_scheduler(blocking=True, config=WORKER_CONFIG)
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Scheduler worker stopped")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Population-wide expense anomaly check: wall time and peak memory against history size.
+
+Usage: python -m benchmarks.bench_expense_anomalies [--users 50000] [--months 24] [--workers 1]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import update
+
+from app import db
+from app.database import Finance
+from app.evaluation import run_expense_anomaly_check
+from app.metrics import peak_rss_mb
+from benchmarks.bench_daily_check import build_app, seed_users
+from benchmarks.bench_sharded_trends import seed_finances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--spike-share', type=float, default=0.02)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            seed_users(args.users)
+            seed_finances(args.users, args.months)
+            # Triple the latest expense of a random share of users
+            spiked = np.random.default_rng(1).choice(args.users, int(args.users * args.spike_share), replace=False) + 1
+            db.session.execute(
+                update(Finance)
+                .where(Finance.user_id.in_(spiked.tolist()), Finance.id % args.months == 0)
+                .values(expenses=Finance.expenses * 3)
+            )
+            db.session.commit()
+            
+            rss_before = peak_rss_mb()
+            start = time.perf_counter()
+            shards, alerts = run_expense_anomaly_check(workers=args.workers)
+            elapsed = time.perf_counter() - start
+            rows = args.users * args.months
+            print(f"{rows} finance rows, {shards} shards: {alerts} alerts in {elapsed:.2f}s "
+                  f"({rows / elapsed:,.0f} rows/s), peak RSS {rss_before:.0f} -> {peak_rss_mb():.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Monte Carlo goal forecast: one user at 10k paths x 360 months, then a batch of users.
+
+Usage: python -m benchmarks.bench_goal_forecast [--paths 10000] [--months 360] [--users 1000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.forecasting import forecast_goal, forecast_goals
+
+
+def best_of(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paths', type=int, default=10000)
+    parser.add_argument('--months', type=int, default=360)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    single, forecast = best_of(lambda: forecast_goal(100000, 60000, 2e7, args.months, 'High',
+                                                     paths=args.paths, seed=42), args.runs)
+    print(f"single user: {args.paths} paths x {args.months} months in {single * 1000:.1f} ms "
+          f"(p={forecast['probability']:.3f}, median ₹{forecast['percentiles'][50]:,.0f})")
+
+    rng = np.random.default_rng(0)
+    income = rng.uniform(30000, 200000, args.users)
+    expenses = income * rng.uniform(0.4, 0.95, args.users)
+    goal_months = rng.integers(12, 120, args.users)
+    profiles = rng.choice(['Low', 'Medium', 'High'], args.users)
+    batch, result = best_of(lambda: forecast_goals(income, expenses, income * 24, goal_months, profiles,
+                                                   paths=1000, seed=42), 1)
+    print(f"batch: {args.users} users x 1000 paths in {batch:.2f}s "
+          f"(mean p={result['probability'].mean():.3f})")
+
+
+if __name__ == '__main__':
+    main()
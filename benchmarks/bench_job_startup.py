@@ -0,0 +1,53 @@
+"""Per-job startup overhead: create_app() per run versus the shared job app.
+
+Usage: python -m benchmarks.bench_job_startup [--runs 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import select
+
+from app import create_app, db
+from app.database import User
+from app import scheduler
+
+
+def start_job(app):
+    # What every job does before its real work: enter a context and touch the DB
+    with app.app_context():
+        db.session.execute(select(User.id).limit(1)).all()
+
+
+def time_runs(make_app, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        start_job(make_app())
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"}
+        scheduler._job_app_config.update(config)
+        
+        results = {
+            'create_app() per job': time_runs(lambda: create_app(config), args.runs),
+            'shared job app': time_runs(scheduler._job_app, args.runs),
+        }
+    
+    print(f"{'startup':<24} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for name, (p50, p95) in results.items():
+        print(f"{name:<24} {p50 * 1000:>10.2f} {p95 * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
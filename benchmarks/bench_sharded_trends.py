@@ -0,0 +1,60 @@
+"""Scaling of the sharded expense trend check with worker count.
+
+Usage: python -m benchmarks.bench_sharded_trends [--users 20000] [--months 12] [--workers 1,2,4,8,16]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, insert
+
+from app import db
+from app.database import Alert, Finance
+from app.evaluation import run_expense_trend_check
+from benchmarks.bench_daily_check import build_app, seed_users
+
+
+def seed_finances(n_users, months, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1)
+    expenses = rng.uniform(10000, 100000, (n_users, months)).round()
+    rows = [{'user_id': user_id + 1, 'expenses': expense, 'timestamp': start + timedelta(days=30 * month)}
+            for user_id in range(n_users)
+            for month, expense in enumerate(expenses[user_id].tolist())]
+    for batch in range(0, len(rows), 50000):
+        db.session.execute(insert(Finance), rows[batch:batch + 50000])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--workers', default='1,2,4,8,16')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            seed_users(args.users)
+            seed_finances(args.users, args.months)
+            
+            print(f"{'workers':>8} {'shards':>8} {'alerts':>8} {'wall (s)':>10} {'speedup':>8}")
+            baseline = None
+            for workers in (int(w) for w in args.workers.split(',')):
+                db.session.execute(delete(Alert))
+                db.session.commit()
+                
+                start = time.perf_counter()
+                shards, alerts = run_expense_trend_check(workers=workers)
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                print(f"{workers:>8} {shards:>8} {alerts:>8} {elapsed:>10.2f} {baseline / elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Import-time budget for a cold web worker and a cold scheduler worker.
+
+Runs each boot in a fresh interpreter under `python -X importtime`, sums the
+top-level import times, lists the slowest modules and fails (exit 1) if a
+boot is over budget or pulls in a module that belongs off the hot path.
+
+Usage: python -m benchmarks.check_import_time [--budget-ms 800] [--runs 3] [--top 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Both boots use an in-memory database so nothing on disk is touched
+BOOTS = {
+    'web': "from app import create_app; create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})",
+    'worker': "import app.scheduler",
+}
+# Imported lazily by the code paths that need them
+DEFERRED_MODULES = {
+    'web': ('pandas', 'huggingface_hub', 'apscheduler'),
+    'worker': ('pandas', 'huggingface_hub'),
+}
+
+
+def import_times(code):
+    """[(module, self_us, cumulative_us, depth)] for one cold interpreter running code"""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=env, cwd=REPO_ROOT, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def top_level_ms(rows):
+    # Top-level entries already include their children
+    return sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-ms', type=float, default=800)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+    
+    failed = False
+    for boot, code in BOOTS.items():
+        # Best of several cold starts, to keep scheduler noise out of the verdict
+        total_ms, rows = min((top_level_ms(rows), rows) for rows in (import_times(code) for _ in range(args.runs)))
+        loaded = {name.split('.')[0] for name, _, _, _ in rows}
+        leaked = [module for module in DEFERRED_MODULES[boot] if module in loaded]
+        
+        status = 'ok' if total_ms <= args.budget_ms and not leaked else 'FAIL'
+        failed = failed or status == 'FAIL'
+        print(f"{boot}: {total_ms:.0f} ms of imports (budget {args.budget_ms:.0f} ms) [{status}]")
+        if leaked:
+            print(f"  should be deferred: {', '.join(leaked)}")
+        for name, _, cumulative, _ in sorted((row for row in rows if row[0].startswith('app')),
+                                             key=lambda row: row[2], reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
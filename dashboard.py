@@ -38,6 +38,15 @@ def load_user_data(user_id):
         pass
     return None
 
+def load_projection(user_id):
+    try:
+        response = requests.get(f'http://localhost:5000/api/projection/{user_id}')
+        if response.status_code == 200:
+            return response.json()
+    except:
+        pass
+    return None
+
 # Helper function to format INR currency
 def format_inr(amount):
     return f"₹{amount:,.0f}"
@@ -173,7 +182,9 @@ if mode == "Dashboard":
             # Goal progress gauge
             goal_amount = st.session_state.user_data.get('goal', 0)
             goal_months = st.session_state.user_data.get('goal_months', 12)
-            projected_savings = savings * goal_months
+            # SIP growth of the savings when the API is reachable, plain savings otherwise
+            projection = load_projection(st.session_state.user_id)
+            projected_savings = projection['total'] if projection else savings * goal_months
             progress = min((projected_savings / goal_amount * 100) if goal_amount > 0 else 0, 100)
             
             fig = go.Figure(go.Indicator(
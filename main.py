@@ -1,12 +1,20 @@
 from app import create_app
-from app.scheduler import start_scheduler
+from app.events import start_event_consumer
+import os
 import threading
 
 app = create_app()
 
-# Start scheduler in background thread
-scheduler_thread = threading.Thread(target=start_scheduler, daemon=True)
-scheduler_thread.start()
+# Alerts for a changed profile are evaluated in the background within seconds
+start_event_consumer(app)
+
+# Scheduled jobs run in their own process (Procfile "worker": python -m app.worker).
+# Set RUN_SCHEDULER_IN_WEB=1 to run them in a background thread of the web process instead.
+if os.getenv('RUN_SCHEDULER_IN_WEB') == '1':
+    from app.scheduler import start_scheduler
+    
+    scheduler_thread = threading.Thread(target=start_scheduler, daemon=True)
+    scheduler_thread.start()
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)